@@ -2,11 +2,14 @@
 # app.py
 import os
 import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
 import pandas as pd
 import streamlit as st
-from mini_project2 import (
-    ex1, ex2, ex3, ex4, ex5, ex6, ex7, ex8, ex9, ex10, ex11
-)
+from mini_project2 import FRAME_QUERIES, ROLLUP_QUERIES, SalesFrames, prepare_query
 
 # Optional: import Groq if API key is available
 try:
@@ -74,9 +77,72 @@ h1,h2,h3 {
 # ========================
 # Database connection
 # ========================
+# The dashboard never writes, so every connection is read-only (mode=ro, not
+# immutable: ingest_incremental and the rollup triggers write normalized.db in
+# place while the app is running).
+READ_PRAGMAS = {
+    "mmap_size": 268435456,
+    "cache_size": -65536,
+}
+
+class ConnectionPool:
+    # One read-only connection per thread (Streamlit runs each session's
+    # script in its own thread). A change of the database fingerprint (a
+    # rebuild or ingest) starts a new pool generation; a connection is only
+    # ever closed by its own thread, which reopens it on its next get() once
+    # it is from an older generation, or by the reaper once its thread is gone.
+    def __init__(self, db_path, pragmas=READ_PRAGMAS):
+        self.uri = f"file:{quote(db_path)}?mode=ro"
+        self.pragmas = pragmas
+        self.connections = {}
+        self.fingerprint = None
+        self.generation = 0
+        self.opened = 0
+        self.reused = 0
+        self.closed = 0
+        self.lock = threading.Lock()
+
+    def connect(self):
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        for pragma, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {pragma}={value}")
+        return conn
+
+    def get(self):
+        thread = threading.current_thread()
+        fingerprint = db_fingerprint()
+        with self.lock:
+            if fingerprint != self.fingerprint:
+                self.fingerprint = fingerprint
+                self.generation += 1
+            for dead in [t for t in self.connections if not t.is_alive()]:
+                self.connections.pop(dead)[0].close()
+                self.closed += 1
+            entry = self.connections.get(thread)
+            if entry is not None:
+                conn, generation = entry
+                if generation == self.generation:
+                    self.reused += 1
+                    return conn
+                conn.close()
+                self.closed += 1
+            conn = self.connect()
+            self.connections[thread] = (conn, self.generation)
+            self.opened += 1
+            return conn
+
+    def metrics(self):
+        with self.lock:
+            stale = sum(generation != self.generation for _, generation in self.connections.values())
+            return {"open": len(self.connections), "stale": stale, "generation": self.generation,
+                    "opened": self.opened, "reused": self.reused, "closed": self.closed}
+
+@st.cache_resource
+def get_connection_pool():
+    return ConnectionPool(DB_PATH)
+
 def get_connection():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    return conn
+    return get_connection_pool().get()
 
 @st.cache_data
 def get_customer_names():
@@ -86,18 +152,305 @@ def get_customer_names():
     )
     return df["Name"].tolist()
 
-def run_query(sql: str) -> pd.DataFrame:
+# ========================
+# Query budget
+# ========================
+# Custom and AI-generated SQL run under a time and VM-step budget. SQLite
+# calls the progress handler every QUERY_PROGRESS_INTERVAL VM instructions
+# and abandons the statement as soon as the handler returns non-zero.
+QUERY_TIME_BUDGET = 10.0
+QUERY_STEP_BUDGET = 200_000_000
+QUERY_PROGRESS_INTERVAL = 10000
+QUERY_LOG_SIZE = 100
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+def get_query_log():
+    # Budget used by this session's most recent guarded queries. The entries
+    # hold the SQL text, so the log is kept per session and never shared.
+    if "query_log" not in st.session_state:
+        st.session_state.query_log = deque(maxlen=QUERY_LOG_SIZE)
+    return st.session_state.query_log
+
+class QueryGuard:
+    def __init__(self, conn, sql, time_budget=QUERY_TIME_BUDGET, step_budget=QUERY_STEP_BUDGET):
+        self.conn = conn
+        self.sql = sql
+        self.time_budget = time_budget
+        self.step_budget = step_budget
+
+    def __enter__(self):
+        self.steps = 0
+        self.exceeded = None
+        self.start = time.perf_counter()
+        self.conn.set_progress_handler(self.check, QUERY_PROGRESS_INTERVAL)
+        return self
+
+    def check(self):
+        self.steps += QUERY_PROGRESS_INTERVAL
+        if self.steps > self.step_budget:
+            self.exceeded = "VM-step"
+        elif time.perf_counter() - self.start > self.time_budget:
+            self.exceeded = "time"
+        return 1 if self.exceeded else 0
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.set_progress_handler(None, 0)
+        self.usage = {"sql": self.sql, "seconds": round(time.perf_counter() - self.start, 3),
+                      "vm_steps": self.steps, "cancelled": self.exceeded}
+        get_query_log().append(self.usage)
+        if self.exceeded and isinstance(exc, sqlite3.OperationalError):
+            raise QueryBudgetExceeded(
+                f"Query cancelled: {self.exceeded} budget exceeded after "
+                f"{self.usage['seconds']:.1f}s and ~{self.steps:,} VM steps "
+                f"(limits {self.time_budget:g}s, {self.step_budget:,} steps)") from exc
+        return False
+
+# Custom and AI-generated SQL can return the whole fact table, so their
+# results are read a page at a time and never past the row cap
+RESULT_PAGE_SIZE = 500
+RESULT_ROW_CAP = 10000
+
+def fetch_page(sql: str, page=0, page_size=RESULT_PAGE_SIZE, row_cap=RESULT_ROW_CAP):
+    # Returns (DataFrame, has_next, usage) for one page of the result. Rows
+    # before the page are skipped in page_size chunks, so memory stays at one
+    # page; the whole fetch runs under a QueryGuard.
+    start = page * page_size
+    stop = min(start + page_size, row_cap)
+    conn = get_connection()
+    with QueryGuard(conn, sql) as guard:
+        cursor = conn.execute(sql)
+        try:
+            columns = [d[0] for d in cursor.description] if cursor.description else []
+            skipped = 0
+            while skipped < start:
+                chunk = cursor.fetchmany(min(page_size, start - skipped))
+                if not chunk:
+                    break
+                skipped += len(chunk)
+            rows = cursor.fetchmany(stop - start) if stop > start else []
+            has_next = stop < row_cap and cursor.fetchone() is not None
+        finally:
+            cursor.close()
+    return pd.DataFrame(rows, columns=columns), has_next, guard.usage
+
+def show_paged_result(sql: str):
+    page = st.session_state.get("result_page", 0)
+    try:
+        df, has_next, usage = fetch_page(sql, page)
+    except QueryBudgetExceeded as e:
+        st.error(str(e))
+        return
+    except Exception as e:
+        st.error(f"Error running SQL: {e}")
+        return
+    st.markdown("Results")
+    st.caption(f"Page query took {usage['seconds']:.3f}s and ~{usage['vm_steps']:,} VM steps")
+    first = page * RESULT_PAGE_SIZE
+    caption = f"Rows {first + 1:,} to {first + len(df):,}" if len(df) else "No rows"
+    if not has_next and first + len(df) >= RESULT_ROW_CAP:
+        caption += f" (results are capped at {RESULT_ROW_CAP:,} rows)"
+    st.caption(caption)
+    st.dataframe(df, use_container_width=True)
+    prev_col, next_col = st.columns(2)
+    if prev_col.button("Previous page", disabled=page == 0):
+        st.session_state.result_page = page - 1
+        st.rerun()
+    if next_col.button("Next page", disabled=not has_next):
+        st.session_state.result_page = page + 1
+        st.rerun()
+
+PREVIEW_TABLES = ["Region", "Country", "Customer", "ProductCategory", "Product", "OrderDetail"]
+
+# The preview only changes when normalized.db does, so both helpers take the
+# database fingerprint as a cache key and run once per database version.
+@st.cache_data(max_entries=4)
+def get_table_stats(fingerprint):
+    # Row count of every preview table and the database size, read from
+    # metadata only. The pipeline never deletes rows, so a table's largest
+    # rowid (one b-tree edge lookup) is its row count; the size comes from
+    # the page count instead of reading every page through dbstat.
+    counts = ", ".join(f"(SELECT IFNULL(MAX(rowid), 0) FROM {table})" for table in PREVIEW_TABLES)
     conn = get_connection()
-    return pd.read_sql_query(sql, conn)
+    row_counts = conn.execute(f"SELECT {counts}").fetchone()
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return dict(zip(PREVIEW_TABLES, row_counts)), page_count * page_size
+
+@st.cache_data(max_entries=4 * len(PREVIEW_TABLES))
+def get_table_preview(table, fingerprint):
+    return pd.read_sql_query(f"SELECT * FROM {table} LIMIT 10;", get_connection())
 
 def show_top_10_tables():
-    conn = get_connection()
-    tables = ["Region", "Country", "Customer", "ProductCategory", "Product", "OrderDetail"]
+    # Expander bodies run on every rerun even when collapsed, so they only
+    # read the cached preview of the current database version
+    fingerprint = db_fingerprint()
+    row_counts, size = get_table_stats(fingerprint)
     st.markdown("## Database Preview (Top 10 Rows)")
-    for table in tables:
-        with st.expander(f"Top 10 rows from {table}", expanded=False):
-            df = pd.read_sql_query(f"SELECT * FROM {table} LIMIT 10;", conn)
+    st.caption(f"normalized.db: {size / 1024:,.0f} KB")
+    for table in PREVIEW_TABLES:
+        label = f"Top 10 rows from {table} ({row_counts[table]:,} rows)"
+        with st.expander(label, expanded=False):
+            st.dataframe(get_table_preview(table, fingerprint), use_container_width=True)
+
+# ========================
+# Result cache
+# ========================
+RESULT_CACHE_SIZE = 64
+
+def db_fingerprint():
+    # Changes whenever normalized.db is rebuilt (new inode) or written to
+    stat = os.stat(DB_PATH)
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+class ResultCache:
+    # LRU of predefined-query results shared by every session. Entries are
+    # tied to the database fingerprint they were computed from, so a rebuild
+    # of normalized.db empties the cache on the next lookup.
+    def __init__(self, max_entries=RESULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_or_run(self, key, run):
+        # Returns (cached, value); run() computes the value on a miss
+        fingerprint = db_fingerprint()
+        with self.lock:
+            if fingerprint != self.fingerprint:
+                self.entries.clear()
+                self.fingerprint = fingerprint
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, self.entries[key]
+            self.misses += 1
+        value = run()
+        with self.lock:
+            if fingerprint == self.fingerprint:
+                self.entries[key] = value
+                if len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return False, value
+
+@st.cache_resource
+def get_result_cache():
+    return ResultCache()
+
+# Queries the SQLite backend answers from SalesRollup, whose variants give
+# exN's exact results (prepare_query falls back to exN without the table)
+DASHBOARD_VARIANTS = {name: "rollup" for name in ROLLUP_QUERIES}
+
+def run_predefined_query(query_name, query_args=(), conn=None, cache=None, frames=None):
+    # Returns (sql, params, DataFrame, cached) for ex1 ... ex11; with frames
+    # (a SalesFrames) ex3-ex11 are answered in memory instead of by the SQL
+    in_memory = frames is not None and query_name in FRAME_QUERIES
+    variant = None if in_memory else DASHBOARD_VARIANTS.get(query_name)
+    def run():
+        run_conn = conn or get_connection()
+        sql, params = prepare_query(run_conn, query_name, *query_args, variant=variant)
+        if in_memory:
+            return sql, params, FRAME_QUERIES[query_name](frames)
+        return sql, params, pd.read_sql_query(sql, run_conn, params=params)
+    cache = cache or get_result_cache()
+    cached, (sql, params, df) = cache.get_or_run((query_name, tuple(query_args), in_memory, variant), run)
+    return sql, params, df, cached
+
+# ========================
+# Query service
+# ========================
+# Predefined queries run on a shared thread pool so the page keeps
+# rendering while they execute. Each worker thread reads through its own
+# pooled connection; the script polls the futures and reruns until all of a
+# session's jobs are done, showing finished results as they arrive.
+QUERY_WORKERS = 4
+QUERY_POLL_INTERVAL = 0.5
+
+QUERY_BACKENDS = {"SQLite": "sqlite", "In-memory (pandas)": "pandas"}
+
+class QueryJob:
+    def __init__(self, name, args, backend="sqlite"):
+        self.name = name
+        self.args = args
+        self.backend = backend
+        self.steps = 0
+        self.start = time.perf_counter()
+        self.seconds = None
+        self.future = None
+
+    def progress(self):
+        # Progress handler on the worker's connection; never interrupts
+        self.steps += QUERY_PROGRESS_INTERVAL
+        return 0
+
+    def elapsed(self):
+        return self.seconds if self.seconds is not None else time.perf_counter() - self.start
+
+class QueryService:
+    def __init__(self, pool, cache, workers=QUERY_WORKERS):
+        self.pool = pool
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query")
+        self.frames = None
+        self.frames_lock = threading.Lock()
+
+    def submit(self, name, args=(), backend="sqlite"):
+        job = QueryJob(name, tuple(args), backend)
+        job.future = self.executor.submit(self.run, job)
+        return job
+
+    def get_frames(self, conn):
+        # SalesFrames of the current database version, loaded on first use
+        fingerprint = db_fingerprint()
+        with self.frames_lock:
+            if self.frames is None or self.frames[0] != fingerprint:
+                self.frames = (fingerprint, SalesFrames(conn))
+            return self.frames[1]
+
+    def run(self, job):
+        conn = self.pool.get()
+        conn.set_progress_handler(job.progress, QUERY_PROGRESS_INTERVAL)
+        try:
+            frames = self.get_frames(conn) if job.backend == "pandas" else None
+            return run_predefined_query(job.name, job.args, conn=conn, cache=self.cache, frames=frames)
+        finally:
+            conn.set_progress_handler(None, 0)
+            job.seconds = time.perf_counter() - job.start
+
+@st.cache_resource
+def get_query_service():
+    return QueryService(get_connection_pool(), get_result_cache())
+
+def show_query_jobs(jobs):
+    # Renders finished jobs and a progress line for running ones; returns
+    # True while any job is still running
+    running = False
+    panels = st.tabs([job.name for job in jobs]) if len(jobs) > 1 else [st.container()]
+    for panel, job in zip(panels, jobs):
+        with panel:
+            if not job.future.done():
+                running = True
+                st.info(f"{job.name} running: {job.elapsed():.1f}s, ~{job.steps:,} VM steps")
+                continue
+            try:
+                sql, params, df, cached = job.future.result()
+            except Exception as e:
+                st.error(f"Error running {job.name}: {e}")
+                continue
+            st.markdown("SQL being executed:")
+            st.code(sql, language="sql")
+            if params:
+                st.caption(f"Parameters: {params}")
+            if cached:
+                st.caption("Served from the result cache")
+            else:
+                st.caption(f"Finished in {job.elapsed():.3f}s on the {job.backend} backend, ~{job.steps:,} VM steps")
+            st.markdown("Results")
             st.dataframe(df, use_container_width=True)
+    return running
 
 # ========================
 # Authentication
@@ -143,6 +496,12 @@ st.sidebar.markdown("""
 4. Ask AI to generate SQL automatically
 """)
 
+with st.sidebar.expander("Connection pool", expanded=False):
+    st.json(get_connection_pool().metrics())
+
+with st.sidebar.expander("Query budget log", expanded=False):
+    st.dataframe(pd.DataFrame(list(get_query_log())), use_container_width=True)
+
 # -------------------------
 # Layout Columns
 # -------------------------
@@ -153,24 +512,29 @@ left_col, right_col = st.columns([1, 1.5])
 # -------------------------
 with left_col:
     st.subheader("Predefined Queries")
-    query_option = st.selectbox(
-        "Select a predefined query",
-        [
-            "ex1: Customer order details with totals",
-            "ex2: Customer total spending",
-            "ex3: All customers ranked by total",
-            "ex4: Regional sales totals",
-            "ex5: Country sales totals",
-            "ex6: Countries ranked within each region",
-            "ex7: Top country per region",
-            "ex8: Customer sales by quarter-year",
-            "ex9: Top 5 customers per quarter",
-            "ex10: Monthly sales ranking across years",
-            "ex11: Customer maximum days without orders",
-        ],
+    query_options = [
+        "ex1: Customer order details with totals",
+        "ex2: Customer total spending",
+        "ex3: All customers ranked by total",
+        "ex4: Regional sales totals",
+        "ex5: Country sales totals",
+        "ex6: Countries ranked within each region",
+        "ex7: Top country per region",
+        "ex8: Customer sales by quarter-year",
+        "ex9: Top 5 customers per quarter",
+        "ex10: Monthly sales ranking across years",
+        "ex11: Customer maximum days without orders",
+    ]
+    query_option = st.selectbox("Select a predefined query", query_options)
+
+    compare_options = st.multiselect(
+        "Compare predefined queries (run concurrently)",
+        query_options,
     )
 
-    needs_customer = query_option.startswith(("ex1", "ex2"))
+    query_name = query_option.split(":", 1)[0]
+    compare_names = [option.split(":", 1)[0] for option in compare_options]
+    needs_customer = any(name in ("ex1", "ex2") for name in [query_name] + compare_names)
     customers = get_customer_names()
     selected_customer = st.selectbox(
         "Select a customer",
@@ -178,7 +542,9 @@ with left_col:
         disabled=not needs_customer
     )
 
+    query_backend = QUERY_BACKENDS[st.radio("Query backend", list(QUERY_BACKENDS), horizontal=True)]
     run_predefined = st.button("Run Predefined Query")
+    run_compare = st.button("Run Comparison", disabled=not compare_names)
 
     st.markdown("### Custom SQL Query")
     custom_sql = st.text_area("Write your own SQL", "SELECT * FROM Customer LIMIT 5;", height=160)
@@ -192,48 +558,24 @@ with left_col:
 # Right column - Output
 # -------------------------
 with right_col:
-    result_df = None
     result_sql = ""
     ai_generated_sql = None
 
     # Predefined queries
-    if run_predefined:
-        conn = get_connection()
-        try:
-            if query_option.startswith("ex1"):
-                result_sql = ex1(conn, selected_customer)
-            elif query_option.startswith("ex2"):
-                result_sql = ex2(conn, selected_customer)
-            elif query_option.startswith("ex3"):
-                result_sql = ex3(conn)
-            elif query_option.startswith("ex4"):
-                result_sql = ex4(conn)
-            elif query_option.startswith("ex5"):
-                result_sql = ex5(conn)
-            elif query_option.startswith("ex6"):
-                result_sql = ex6(conn)
-            elif query_option.startswith("ex7"):
-                result_sql = ex7(conn)
-            elif query_option.startswith("ex8"):
-                result_sql = ex8(conn)
-            elif query_option.startswith("ex9"):
-                result_sql = ex9(conn)
-            elif query_option.startswith("ex10"):
-                result_sql = ex10(conn)
-            elif query_option.startswith("ex11"):
-                result_sql = ex11(conn)
-
-            result_df = run_query(result_sql)
-        except Exception as e:
-            st.error(f"Error running query: {e}")
+    if run_predefined or run_compare:
+        names = [query_name] if run_predefined else compare_names
+        service = get_query_service()
+        st.session_state.paged_sql = None
+        st.session_state.query_jobs = [
+            service.submit(name, (selected_customer,) if name in ("ex1", "ex2") else (), query_backend)
+            for name in names
+        ]
 
     # Custom SQL
     if run_custom_sql:
-        result_sql = custom_sql
-        try:
-            result_df = run_query(custom_sql)
-        except Exception as e:
-            st.error(f"Error running custom SQL: {e}")
+        st.session_state.query_jobs = []
+        st.session_state.paged_sql = custom_sql
+        st.session_state.result_page = 0
 
     # AI-generated SQL
     if run_ai:
@@ -290,11 +632,14 @@ Tables:
                         ai_sql = ai_sql[3:].strip()
 
                 ai_generated_sql = ai_sql
-                result_sql = ai_sql
-                try:
-                    result_df = run_query(ai_sql)
-                except Exception as e:
-                    st.error(f"SQL execution error: {e}")
+                st.session_state.query_jobs = []
+                st.session_state.paged_sql = ai_sql
+                st.session_state.result_page = 0
+
+    # Custom and AI-generated SQL stay on screen while paging
+    paged_sql = st.session_state.get("paged_sql")
+    if paged_sql:
+        result_sql = paged_sql
 
     # Display SQL
     if ai_generated_sql:
@@ -305,8 +650,12 @@ Tables:
         st.code(result_sql, language="sql")
 
     # Display results
-    if result_df is not None:
-        st.markdown("Results")
-        st.dataframe(result_df, use_container_width=True)
+    query_jobs = st.session_state.get("query_jobs")
+    if query_jobs:
+        if show_query_jobs(query_jobs):
+            time.sleep(QUERY_POLL_INTERVAL)
+            st.rerun()
+    elif paged_sql:
+        show_paged_result(paged_sql)
     else:
         st.info("Run a predefined query, custom SQL, or AI-generated SQL to see results here.")
@@ -0,0 +1,145 @@
+### Benchmarks for the normalization pipeline
+# Run all of them with `python benchmarks.py`, or a single one by name,
+# e.g. `python benchmarks.py order_date`.
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+import mini_project2
+
+
+def bench_order_date(n=200000, distinct=3000, repeat=3):
+    # Compares strptime/strftime with convert_order_date on order dates that
+    # repeat the way they do in data.csv (a few thousand distinct days).
+    random.seed(0)
+    start = datetime.date(2010, 1, 1)
+    days = [(start + datetime.timedelta(days=i)).strftime("%Y%m%d") for i in range(distinct)]
+    dates = [random.choice(days) for _ in range(n)]
+
+    def strptime_path():
+        for od in dates:
+            datetime.datetime.strptime(od, "%Y%m%d").strftime("%Y-%m-%d")
+
+    def cold_cache_path():
+        mini_project2.convert_order_date.cache_clear()
+        for od in dates:
+            mini_project2.convert_order_date(od)
+
+    baseline = min(timeit.repeat(strptime_path, number=1, repeat=repeat))
+    optimized = min(timeit.repeat(cold_cache_path, number=1, repeat=repeat))
+    print(f"order_date: {n} dates, strptime {baseline:.3f}s, "
+          f"convert_order_date {optimized:.3f}s ({baseline / optimized:.1f}x)")
+    return baseline, optimized
+
+
+def synthetic_orders_database(database_filename, customers=5000, orders=500000, days=3650):
+    # Writes Country, Customer and OrderDetail tables with the normalized
+    # schema and random order dates (several lines share a day, as in data.csv)
+    random.seed(0)
+    start = datetime.date(2010, 1, 1)
+    dates = [(start + datetime.timedelta(days=i)).isoformat() for i in range(days)]
+    conn = sqlite3.connect(database_filename)
+    for table in ("Country", "Customer", "OrderDetail"):
+        mini_project2.create_table(conn, mini_project2.COLLECTORS[table].create_table_sql, drop_table_name=table)
+    with conn:
+        conn.executemany(mini_project2.COLLECTORS["Country"].insert_sql,
+                         [(f"Country{i}", 1) for i in range(1, 21)])
+        conn.executemany(mini_project2.COLLECTORS["Customer"].insert_sql,
+                         [("First", f"Last{i}", "Address", "City", random.randint(1, 20))
+                          for i in range(customers)])
+        rows = []
+        for _ in range(orders // 3):
+            customer_id = random.randint(1, customers)
+            orderdate = random.choice(dates)
+            rows.extend((customer_id, random.randint(1, 100), orderdate, random.randint(1, 9)) for _ in range(3))
+        conn.executemany(mini_project2.COLLECTORS["OrderDetail"].insert_sql, rows)
+    mini_project2.create_indexes(conn, ["Country", "Customer", "OrderDetail"])
+    return conn
+
+
+def bench_ex11(customers=5000, orders=500000, repeat=3):
+    # Compares the ex11 statement with max_days_without_order on a synthetic
+    # database with about `orders` order lines
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = synthetic_orders_database(os.path.join(tmp, "ex11.db"), customers, orders)
+        statement = mini_project2.ex11(conn)
+        expected = conn.execute(statement).fetchall()
+        assert mini_project2.max_days_without_order(conn) == expected
+        baseline = min(timeit.repeat(lambda: conn.execute(statement).fetchall(), number=1, repeat=repeat))
+        optimized = min(timeit.repeat(lambda: mini_project2.max_days_without_order(conn), number=1, repeat=repeat))
+        conn.close()
+    print(f"ex11: {orders} order lines, {customers} customers, statement {baseline:.3f}s, "
+          f"max_days_without_order {optimized:.3f}s ({baseline / optimized:.1f}x)")
+    return baseline, optimized
+
+
+def synthetic_data_file(data_filename, customers=20000, lines_per_customer=15, days=3650):
+    # Writes a tab-separated file in the data.csv layout: every customer row
+    # carries `lines_per_customer` order lines drawn from 77 products
+    random.seed(0)
+    start = datetime.date(2010, 1, 1)
+    dates = [(start + datetime.timedelta(days=i)).strftime("%Y%m%d") for i in range(days)]
+    countries = [(f"Country{i}", f"Region{i % 5}") for i in range(20)]
+    products = [(f"Prod{i:03d}", f"Category{i % 8}", f"Description{i % 8}", f"{random.uniform(1, 100):.2f}")
+                for i in range(77)]
+    with open(data_filename, "w") as f:
+        f.write("Name\tAddress\tCity\tCountry\tRegion\tProductName\tProductCategory\t"
+                "ProductCategoryDescription\tProductUnitPrice\tQuantityOrderded\tOrderDate\n")
+        for i in range(customers):
+            country, region = random.choice(countries)
+            lines = [random.choice(products) for _ in range(lines_per_customer)]
+            columns = [";".join(column) for column in zip(*lines)]
+            quantities = ";".join(str(random.randint(1, 20)) for _ in lines)
+            orderdates = ";".join(random.choice(dates) for _ in lines)
+            f.write("\t".join([f"First{i % 500} Last{i}", f"{i} Main St", f"City{i % 300}", country, region,
+                               *columns, quantities, orderdates]) + "\n")
+
+
+class OrderLineList(mini_project2.OrderDetailCollector):
+    # The previous OrderDetail collector layout: one tuple per order line
+    def __init__(self):
+        self.orders = []
+
+    def add(self, parts):
+        self.orders.extend(mini_project2.parse_order_lines(parts))
+
+
+def traced_peak(collector, data_filename):
+    # Peak traced allocation (MB) while scanning data_filename into collector
+    tracemalloc.start()
+    mini_project2.scan_data_file(data_filename, [collector])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def bench_memory(customers=20000, lines_per_customer=15):
+    # Compares the peak memory of collecting every order line as tuples of
+    # strings with the interned, array-backed OrderDetailCollector
+    with tempfile.TemporaryDirectory() as tmp:
+        data_filename = os.path.join(tmp, "data.csv")
+        synthetic_data_file(data_filename, customers, lines_per_customer)
+        baseline = traced_peak(OrderLineList(), data_filename)
+        collector = mini_project2.OrderDetailCollector()
+        optimized = traced_peak(collector, data_filename)
+    print(f"memory: {len(collector)} order lines, tuple list {baseline:.1f}MB, "
+          f"OrderDetailCollector {optimized:.1f}MB ({baseline / optimized:.1f}x)")
+    return baseline, optimized
+
+
+BENCHMARKS = {
+    "order_date": bench_order_date,
+    "ex11": bench_ex11,
+    "memory": bench_memory,
+}
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
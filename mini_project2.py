@@ -1,9 +1,222 @@
 ### Utility Functions
+import contextlib
+import datetime
+import functools
+import json
+from array import array
+import numpy as np
 import pandas as pd
 import sqlite3
+import time
+import tracemalloc
 from sqlite3 import Error
 
-def create_connection(db_file, delete_db=False):
+# Bulk builds trade crash safety for load speed: a failed build is simply rerun
+BULK_LOAD_PRAGMAS = [
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA cache_size = -262144",
+    "PRAGMA temp_store = MEMORY",
+]
+SAFE_PRAGMAS = [
+    "PRAGMA journal_mode = DELETE",
+    "PRAGMA synchronous = FULL",
+    "PRAGMA cache_size = -2000",
+    "PRAGMA temp_store = DEFAULT",
+]
+
+### Build Profiler
+# Opt-in instrumentation of a build. Inside `with BuildProfiler(...)` every
+# @profiled function and profile_span block opens a span that records wall
+# time, CPU time (including finished worker processes), peak traced memory
+# and named counters; spans nest the way the calls do. profile_count adds to
+# a counter of the innermost span: rows_in (data rows scanned), <table>.rows_out
+# (rows inserted) and one <table>.skipped_<reason> per skipped-row branch.
+# Without an active profiler all of these cost a single global check.
+# Memory tracing slows parsing down considerably, so pass trace_memory=False
+# when only the times are of interest.
+
+_build_profiler = None
+
+
+def cpu_time():
+    # CPU seconds of this process plus those of its finished child processes
+    try:
+        import resource
+    except ImportError:
+        return time.process_time()
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def max_rss_bytes():
+    # Peak resident set size of this process, or None where it is unavailable
+    try:
+        import resource
+    except ImportError:
+        return None
+    import sys
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+class ProfileSpan:
+    # One timed call or block and the spans opened while it ran
+
+    def __init__(self, name, memory):
+        self.name = name
+        self.counts = {}
+        self.children = []
+        self.wall_start = time.perf_counter()
+        self.cpu_start = cpu_time()
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.memory_start = memory
+        self.memory_peak = memory
+
+    def stop(self):
+        self.wall_seconds = time.perf_counter() - self.wall_start
+        self.cpu_seconds = cpu_time() - self.cpu_start
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def report(self):
+        return {
+            "name": self.name,
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "peak_memory_bytes": self.memory_peak - self.memory_start,
+            "counts": dict(self.counts),
+            "children": [child.report() for child in self.children],
+        }
+
+
+class BuildProfiler:
+    # Context manager collecting the spans of one build. On exit the report
+    # (see report()) is written as JSON to report_filename, if one was given.
+
+    def __init__(self, report_filename=None, name="build", trace_memory=True):
+        self.report_filename = report_filename
+        self.name = name
+        self.trace_memory = trace_memory
+        self.stack = []
+        self.root = None
+        self.started_at = None
+
+    def __enter__(self):
+        global _build_profiler
+        self.previous = _build_profiler
+        self.started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+        self.started_at = datetime.datetime.now().isoformat(timespec="seconds")
+        self.root = self.open(self.name)
+        _build_profiler = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _build_profiler
+        self.close(self.root)
+        _build_profiler = self.previous
+        if self.started_tracing:
+            tracemalloc.stop()
+        if self.report_filename is not None:
+            with open(self.report_filename, "w") as f:
+                json.dump(self.report(), f, indent=2)
+        return False
+
+    def memory(self):
+        # Currently traced bytes; the peak reached since the previous call is
+        # folded into every open span first
+        if not self.trace_memory:
+            return 0
+        current, peak = tracemalloc.get_traced_memory()
+        for span in self.stack:
+            span.memory_peak = max(span.memory_peak, peak)
+        tracemalloc.reset_peak()
+        return current
+
+    def open(self, name):
+        span = ProfileSpan(name, self.memory())
+        if self.stack:
+            self.stack[-1].children.append(span)
+        self.stack.append(span)
+        return span
+
+    def close(self, span):
+        self.memory()
+        span.stop()
+        self.stack.remove(span)
+
+    def count(self, name, n=1):
+        counts = self.stack[-1].counts
+        counts[name] = counts.get(name, 0) + n
+
+    def report(self):
+        # Output: Dictionary with the build totals, counters summed over all
+        #         spans, per-function call totals and the span tree
+        counts = {}
+        functions = {}
+        for span in self.root.walk():
+            for name, n in span.counts.items():
+                counts[name] = counts.get(name, 0) + n
+            if span is not self.root and span.wall_seconds is not None:
+                totals = functions.setdefault(span.name, {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0})
+                totals["calls"] += 1
+                totals["wall_seconds"] += span.wall_seconds
+                totals["cpu_seconds"] += span.cpu_seconds
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            "sqlite_version": sqlite3.sqlite_version,
+            "wall_seconds": self.root.wall_seconds,
+            "cpu_seconds": self.root.cpu_seconds,
+            "peak_memory_bytes": self.root.memory_peak - self.root.memory_start if self.trace_memory else None,
+            "max_rss_bytes": max_rss_bytes(),
+            "counts": counts,
+            "functions": functions,
+            "spans": self.root.report(),
+        }
+
+
+@contextlib.contextmanager
+def profile_span(name):
+    # Times the enclosed block as a span of the active profiler, if any
+    profiler = _build_profiler
+    if profiler is None:
+        yield None
+        return
+    span = profiler.open(name)
+    try:
+        yield span
+    finally:
+        profiler.close(span)
+
+
+def profiled(func):
+    # Decorator: every call of func is a span named after it while a
+    # BuildProfiler is active
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _build_profiler is None:
+            return func(*args, **kwargs)
+        with profile_span(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def profile_count(name, n=1):
+    # Adds n to counter name of the innermost open span of the active profiler
+    # (zero counts are dropped, so a skip counter only shows up once it is hit)
+    if _build_profiler is not None and n:
+        _build_profiler.count(name, n)
+
+
+@profiled
+def create_connection(db_file, delete_db=False, foreign_keys=True, bulk=False):
     import os
     if delete_db and os.path.exists(db_file):
         os.remove(db_file)
@@ -11,13 +224,34 @@ def create_connection(db_file, delete_db=False):
     conn = None
     try:
         conn = sqlite3.connect(db_file)
-        conn.execute("PRAGMA foreign_keys = 1")
+        if bulk:
+            # Foreign keys are verified once by finish_bulk_load instead of per row
+            for pragma in BULK_LOAD_PRAGMAS:
+                conn.execute(pragma)
+        elif foreign_keys:
+            conn.execute("PRAGMA foreign_keys = 1")
     except Error as e:
         print(e)
 
     return conn
 
 
+@profiled
+def finish_bulk_load(conn, foreign_keys=True):
+    # Ends a bulk build on conn: checks every foreign key in one pass, then
+    # puts the journal, sync and cache settings back to their safe defaults.
+    violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+    if violations:
+        table, rowid, parent, _ = violations[0]
+        raise sqlite3.IntegrityError(
+            f"{len(violations)} foreign key violation(s), first: {table} row {rowid} -> {parent}")
+    for pragma in SAFE_PRAGMAS:
+        conn.execute(pragma)
+    if foreign_keys:
+        conn.execute("PRAGMA foreign_keys = 1")
+
+
+@profiled
 def create_table(conn, create_table_sql, drop_table_name=None):
     
     if drop_table_name: # You can optionally pass drop_table_name to drop the table. 
@@ -32,7 +266,9 @@ def create_table(conn, create_table_sql, drop_table_name=None):
         c.execute(create_table_sql)
     except Error as e:
         print(e)
-        
+
+
+@profiled
 def execute_sql_statement(sql_statement, conn):
     cur = conn.cursor()
     cur.execute(sql_statement)
@@ -41,43 +277,896 @@ def execute_sql_statement(sql_statement, conn):
 
     return rows
 
-def step1_create_region_table(data_filename, normalized_database_filename):
-    # Inputs: Name of the data and normalized database filename
-    # Output: None
-    
-# WRITE YOUR CODE HERE
-  regions_set=set()
-
-  with open(data_filename,'r',encoding='utf-8') as f:
-    next(f)
-    for line in f:
-      line=line.strip()
-      cols=line.split('\t')
-      if len(cols)<5:
-        continue
-      region=cols[4].strip()
-      if region:
-        regions_set.add(region)
-  
-  sorted_regions=sorted(list(regions_set))
-  conn=create_connection(normalized_database_filename,delete_db=True)
+### Single-pass ETL Engine
+# data.csv is streamed once and every tab-split row is fanned out to one
+# collector per normalized table. Collectors only keep what their table needs;
+# foreign keys are resolved after the scan, once the parent IDs are known.
+
+NORMALIZED_TABLES = ["Region", "Country", "Customer", "ProductCategory", "Product", "OrderDetail"]
+ORDERDETAIL_BATCH_SIZE = 50000
+
+
+class ColumnParser:
+    # Pulls the requested column indexes out of one raw data line. The line is
+    # only split up to the last requested column; requested columns are decoded
+    # and stripped, except those in explode, which become the list of their
+    # (unstripped) ';'-separated values. Columns nobody asked for stay bytes.
+
+    def __init__(self, columns, explode=()):
+        columns = sorted(set(columns))
+        self.plain = tuple(i for i in columns if i not in explode)
+        self.explode = tuple(i for i in columns if i in explode)
+        self.maxsplit = columns[-1] + 1 if columns else 0
+
+    def parse(self, line):
+        parts = line.strip().split(b'\t', self.maxsplit)
+        count = len(parts)
+        for i in self.plain:
+            if i < count:
+                parts[i] = parts[i].decode('utf-8').strip()
+        for i in self.explode:
+            if i < count:
+                parts[i] = parts[i].decode('utf-8').split(';')
+        return parts
+
+
+def collector_parser(collectors):
+    # One ColumnParser covering the columns of every collector in a scan
+    columns = set().union(*(collector.columns for collector in collectors))
+    explode = set().union(*(collector.explode for collector in collectors))
+    return ColumnParser(columns, explode)
+
+
+def dispatch_row(collectors, parts):
+    # A row missing any column a collector declares is malformed for that
+    # collector and skipped; every other collector still gets it.
+    count = len(parts)
+    for collector in collectors:
+        if count >= collector.min_columns:
+            collector.add(parts)
+        else:
+            profile_count(f"{collector.table}.skipped_short_row")
+
+
+class CodeTable:
+    # Interns strings into dense integer codes (strings[code] gives them back),
+    # so collectors can keep one copy of each repeated dimension string and
+    # hold per-row references as machine integers.
+    def __init__(self):
+        self.codes = {}
+        self.strings = []
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.strings)
+            self.strings.append(value)
+        return code
+
+    def remap(self, other):
+        # Array translating other's codes into this table's codes
+        return np.array([self.code(value) for value in other.strings], dtype=np.int32)
+
+
+def remap_codes(codes, mapping, typecode="i"):
+    # Translates an array of codes through a remap() result
+    if not len(codes):
+        return array(typecode)
+    return array(typecode, mapping[np.frombuffer(codes, dtype=np.int32)].astype(np.int32).tobytes())
+
+
+class TableCollector:
+    # A collector declares the columns it reads (exploded on ';' if listed in
+    # explode), picks them out of each parsed row (add), turns that into
+    # insertable rows once parent IDs are known (rows), and names each row by
+    # the natural key its lookup dictionary uses (key). merge folds in a
+    # collector that saw a later part of the file.
+    table = None
+    columns = ()
+    explode = ()
+    create_table_sql = None
+    insert_sql = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.min_columns = max(cls.columns) + 1
+
+    def add(self, parts):
+        raise NotImplementedError
+
+    def merge(self, other):
+        raise NotImplementedError
+
+    def rows(self, lookup):
+        raise NotImplementedError
+
+    def key(self, row):
+        raise NotImplementedError
+
+    def id_map(self, rows):
+        # IDs of rows just inserted into a freshly created table
+        return {self.key(row): rowid for rowid, row in enumerate(rows, start=1)}
+
+
+class RegionCollector(TableCollector):
+    table = "Region"
+    columns = (4,)
+    create_table_sql = """
+    CREATE TABLE IF NOT EXISTS Region (
+      RegionID INTEGER PRIMARY KEY,
+      Region TEXT NOT NULL
+    )
+    """
+    insert_sql = "INSERT INTO Region (Region) VALUES (?)"
 
-  create_table_sql= """ 
-  CREATE TABLE IF NOT EXISTS Region (
-    RegionID INTEGER PRIMARY KEY,
-    Region TEXT NOT NULL
-  )
-  """
-  create_table(conn,create_table_sql,drop_table_name="Region")
+    def __init__(self):
+        self.regions = set()
 
-  region_values=[(r,) for r in sorted_regions]
+    def add(self, parts):
+        region = parts[4]
+        if region:
+            self.regions.add(region)
 
-  with conn:
-    conn.executemany("INSERT INTO Region (Region) VALUES (?)", region_values)
-  conn.close()
+    def merge(self, other):
+        self.regions |= other.regions
+
+    def rows(self, lookup):
+        return [(r,) for r in sorted(self.regions)]
+
+    def key(self, row):
+        return row[0]
+
+
+class CountryCollector(TableCollector):
+    table = "Country"
+    columns = (3, 4)
+    create_table_sql = """
+    CREATE TABLE Country(
+      CountryID INTEGER PRIMARY KEY AUTOINCREMENT,
+      CountryName TEXT NOT NULL,
+      RegionID INTEGER NOT NULL,
+      FOREIGN KEY (RegionID) REFERENCES Region (RegionID)
+    );
+    """
+    insert_sql = "INSERT INTO Country (CountryName,RegionID) VALUES(?,?)"
+
+    def __init__(self):
+        self.countries = set()
+
+    def add(self, parts):
+        self.countries.add((parts[3], parts[4]))
+
+    def merge(self, other):
+        self.countries |= other.countries
+
+    def rows(self, lookup):
+        rr = lookup("Region")
+        return [(country, rr[region]) for country, region in sorted(self.countries, key=lambda x: x[0])]
+
+    def key(self, row):
+        return row[0]
+
+
+class CustomerCollector(TableCollector):
+    table = "Customer"
+    columns = (0, 1, 2, 3)
+    create_table_sql = """
+    CREATE TABLE Customer(
+      CustomerID INTEGER PRIMARY KEY AUTOINCREMENT,
+      FirstName TEXT NOT NULL,
+      LastName TEXT NOT NULL,
+      Address TEXT NOT NULL,
+      City TEXT NOT NULL,
+      CountryID INTEGER NOT NULL,
+      FOREIGN KEY (CountryID) REFERENCES Country(CountryID)
+    );
+    """
+    insert_sql = """
+    INSERT INTO Customer(FirstName,LastName,Address,City,CountryID)
+    VALUES(?,?,?,?,?)
+    """
+
+    def __init__(self):
+        # The country repeats on every customer line, so it is kept as a code
+        self.countries = CodeTable()
+        self.customers = []
+
+    def add(self, parts):
+        try:
+            fname, lname = parts[0].split(" ", 1)
+        except ValueError:
+            profile_count("Customer.skipped_bad_name")
+            return
+        self.customers.append((fname, lname, parts[1], parts[2], self.countries.code(parts[3])))
+
+    def merge(self, other):
+        mapping = self.countries.remap(other.countries)
+        self.customers.extend((fname, lname, address, city, int(mapping[country]))
+                              for fname, lname, address, city, country in other.customers)
+
+    def rows(self, lookup):
+        ctocid = lookup("Country")
+        country_ids = [ctocid.get(country) for country in self.countries.strings]
+        customers = [(fname, lname, address, city, country_ids[country])
+                     for fname, lname, address, city, country in self.customers
+                     if country_ids[country] is not None]
+        profile_count("Customer.skipped_unknown_country", len(self.customers) - len(customers))
+        customers.sort(key=lambda x: (x[0], x[1]))
+        return customers
+
+    def key(self, row):
+        return f"{row[0]} {row[1]}".strip()
+
+
+class ProductCategoryCollector(TableCollector):
+    table = "ProductCategory"
+    columns = (6, 7)
+    explode = (6, 7)
+    create_table_sql = """
+    CREATE TABLE ProductCategory(
+      ProductCategoryID INTEGER PRIMARY KEY AUTOINCREMENT,
+      ProductCategory TEXT NOT NULL,
+      ProductCategoryDescription TEXT NOT NULL
+    );
+    """
+    insert_sql = "INSERT INTO ProductCategory(ProductCategory,ProductCategoryDescription) VALUES(?,?)"
+
+    def __init__(self):
+        self.seen = set()
+        self.categories = []
+
+    def add(self, parts):
+        for cat, desc in zip(parts[6], parts[7]):
+            cat = cat.strip()
+            if cat and cat not in self.seen:
+                self.categories.append((cat, desc.strip()))
+                self.seen.add(cat)
+
+    def merge(self, other):
+        for cat, desc in other.categories:
+            if cat not in self.seen:
+                self.categories.append((cat, desc))
+                self.seen.add(cat)
+
+    def rows(self, lookup):
+        return sorted(self.categories, key=lambda x: x[0])
+
+    def key(self, row):
+        return row[0]
+
+
+class ProductCollector(TableCollector):
+    table = "Product"
+    columns = (5, 6, 8)
+    explode = (5, 6, 8)
+    create_table_sql = """
+    CREATE TABLE Product(
+      ProductID INTEGER PRIMARY KEY AUTOINCREMENT,
+      ProductName TEXT NOT NULL,
+      ProductUnitPrice REAL NOT NULL,
+      ProductCategoryID INTEGER NOT NULL,
+      FOREIGN KEY (ProductCategoryID) REFERENCES ProductCategory(ProductCategoryID)
+    );
+    """
+    insert_sql = "INSERT INTO Product(ProductName,ProductUnitPrice, ProductCategoryID) VALUES(?,?,?)"
+
+    def __init__(self):
+        # Category names map one-to-one onto IDs, so de-duplicating on the name
+        # during the scan keeps the same first-seen rows as keying on the ID.
+        self.seen = set()
+        self.products = []
+
+    def add(self, parts):
+        for p, c, pr in zip(parts[5], parts[6], parts[8]):
+            pname = p.strip()
+            catname = c.strip()
+            try:
+                unitprice = float(pr.strip())
+            except (ValueError, TypeError):
+                profile_count("Product.skipped_bad_price")
+                continue
+            key = (pname, catname)
+            if key not in self.seen:
+                self.products.append((pname, unitprice, catname))
+                self.seen.add(key)
+
+    def merge(self, other):
+        for pname, unitprice, catname in other.products:
+            key = (pname, catname)
+            if key not in self.seen:
+                self.products.append((pname, unitprice, catname))
+                self.seen.add(key)
+
+    def rows(self, lookup):
+        prodcatdict = lookup("ProductCategory")
+        products = [(pname, unitprice, prodcatdict[catname])
+                    for pname, unitprice, catname in self.products
+                    if catname in prodcatdict]
+        profile_count("Product.skipped_unknown_category", len(self.products) - len(products))
+        products.sort(key=lambda x: x[0])
+        return products
+
+    def key(self, row):
+        return row[0]
+
+
+# Short-year dates: a year below 1000 keeps strptime/strftime's unpadded
+# output, so 00120101 becomes '12-01-01', 09991231 '999-12-31' and 00051109
+# '5-11-09'. ex8-ex11 slice OrderDate at fixed positions. For these dates
+# CAST(SUBSTR(OrderDate,1,4) AS INTEGER) still gives the year, but
+# SUBSTR(OrderDate,6,2) straddles a dash ('1-', '-0') or, for a one-digit
+# year, is the day ('09'), and JULIANDAY returns NULL. Everything derived from
+# OrderDate outside the SQL (OrderDetailDate, SalesRollup,
+# max_days_without_order, SalesFrames) reproduces what the SQL makes of them.
+@functools.lru_cache(maxsize=65536)
+def convert_order_date(od):
+    # Converts a YYYYMMDD OrderDate to YYYY-MM-DD, raising ValueError exactly
+    # where datetime.strptime(od, "%Y%m%d") would. Order dates repeat heavily,
+    # so results are memoized on the raw string.
+    # Eight ASCII digits can only split 4/2/2 under "%Y%m%d", so they are
+    # sliced and validated with datetime.date. Years below 1000 and anything
+    # else take the strptime path, whose output formatting differs for them.
+    if len(od) == 8 and od.isascii() and od.isdigit() and od[0] != "0":
+        datetime.date(int(od[:4]), int(od[4:6]), int(od[6:]))
+        return f"{od[:4]}-{od[4:6]}-{od[6:]}"
+    return datetime.datetime.strptime(od, "%Y%m%d").strftime("%Y-%m-%d")
+
+
+def parse_order_lines(parts):
+    # Yields (customer name, product name, ISO order date, quantity) for every
+    # order line of a row parsed for OrderDetailCollector; unparsable lines
+    # are skipped.
+    try:
+        first, last = parts[0].split(" ", 1)
+    except ValueError:
+        profile_count("OrderDetail.skipped_bad_name")
+        return
+    fullnamekey = f"{first.strip()} {last.strip()}"
+
+    for pname, qty, od in zip(parts[5], parts[9], parts[10]):
+        try:
+            qtyval = int(qty.strip())
+            orderdate = convert_order_date(od.strip())
+        except ValueError:
+            profile_count("OrderDetail.skipped_bad_line")
+            continue
+        yield (fullnamekey, pname.strip(), orderdate, qtyval)
+
+
+def resolve_order_lines(order_lines, custtocustid, prodtoprodid):
+    # Maps parsed order lines onto OrderDetail tuples, dropping unknown names
+    for fullnamekey, pname, orderdate, qtyval in order_lines:
+        customer_id = custtocustid.get(fullnamekey)
+        prodid = prodtoprodid.get(pname)
+        if customer_id is None or prodid is None:
+            profile_count("OrderDetail.skipped_unknown_name")
+            continue
+        yield (customer_id, prodid, orderdate, qtyval)
+
+
+class OrderDetailCollector(TableCollector):
+    table = "OrderDetail"
+    columns = (0, 5, 9, 10)
+    explode = (5, 9, 10)
+    create_table_sql = """
+    CREATE TABLE OrderDetail(
+      OrderID INTEGER PRIMARY KEY AUTOINCREMENT,
+      CustomerID INTEGER NOT NULL,
+      ProductID INTEGER NOT NULL,
+      OrderDate TEXT NOT NULL,
+      QuantityOrdered INTEGER NOT NULL,
+      FOREIGN KEY(CustomerID) REFERENCES Customer(CustomerID),
+      FOREIGN KEY(ProductID) REFERENCES Product(ProductID)
+    );
+    """
+    insert_sql = "INSERT INTO OrderDetail(CustomerID,ProductID,OrderDate,QuantityOrdered) VALUES(?,?,?,?)"
+
+    def __init__(self):
+        # Order lines are held column-wise: customer, product and date as
+        # CodeTable codes and the quantity, each in a flat array
+        self.customers = CodeTable()
+        self.products = CodeTable()
+        self.dates = CodeTable()
+        self.customer_codes = array("i")
+        self.product_codes = array("i")
+        self.date_codes = array("i")
+        self.quantities = array("q")
+
+    def __len__(self):
+        return len(self.quantities)
+
+    def add(self, parts):
+        for fullnamekey, pname, orderdate, qtyval in parse_order_lines(parts):
+            self.customer_codes.append(self.customers.code(fullnamekey))
+            self.product_codes.append(self.products.code(pname))
+            self.date_codes.append(self.dates.code(orderdate))
+            self.quantities.append(qtyval)
+
+    def merge(self, other):
+        self.customer_codes.extend(remap_codes(other.customer_codes, self.customers.remap(other.customers)))
+        self.product_codes.extend(remap_codes(other.product_codes, self.products.remap(other.products)))
+        self.date_codes.extend(remap_codes(other.date_codes, self.dates.remap(other.dates)))
+        self.quantities.extend(other.quantities)
+
+    def rows(self, lookup):
+        # Iterator of OrderDetail tuples; names are resolved once per distinct
+        # customer and product, and lines with unknown names are dropped
+        custtocustid, prodtoprodid = lookup("Customer"), lookup("Product")
+        customer_ids = [custtocustid.get(name) for name in self.customers.strings]
+        product_ids = [prodtoprodid.get(name) for name in self.products.strings]
+        dates = self.dates.strings
+        for customer, product, date, qtyval in zip(self.customer_codes, self.product_codes,
+                                                   self.date_codes, self.quantities):
+            customer_id = customer_ids[customer]
+            prodid = product_ids[product]
+            if customer_id is None or prodid is None:
+                profile_count("OrderDetail.skipped_unknown_name")
+                continue
+            yield (customer_id, prodid, dates[date], qtyval)
+
+    def id_map(self, rows):
+        return None
+
+
+# Secondary indexes, derived from what ex1-ex11 and resolve_customer_id join
+# and filter on. They are built once the tables are loaded (rebuilding a table
+# drops its indexes, so they are recreated with it).
+# Every other join in ex3-ex11 goes through an INTEGER PRIMARY KEY, and no
+# query filters on a date range, so nothing else is indexed
+# (explain_queries shows the plans).
+INDEX_PLAN = {
+    "Customer": [
+        # resolve_customer_id (ex1, ex2); covering, MAX(CustomerID) is read from the index
+        "CREATE INDEX IF NOT EXISTS idx_Customer_Name ON Customer(FirstName, LastName)",
+    ],
+    "OrderDetail": [
+        # ex1/ex2 filter on CustomerID. Deliberately not covering: ex1 has no
+        # ORDER BY, and entries of a plain index stay in OrderID order within a
+        # customer, so its rows keep their order.
+        "CREATE INDEX IF NOT EXISTS idx_OrderDetail_CustomerID ON OrderDetail(CustomerID)",
+    ],
+}
+
+
+@profiled
+def create_indexes(conn, tables=None):
+    # Builds the INDEX_PLAN indexes of tables (default: all), then refreshes
+    # the planner statistics
+    with conn:
+        for table in (tables or NORMALIZED_TABLES):
+            for index_sql in INDEX_PLAN.get(table, []):
+                conn.execute(index_sql)
+    conn.execute("PRAGMA optimize")
+
+
+COLLECTORS = {
+    "Region": RegionCollector,
+    "Country": CountryCollector,
+    "Customer": CustomerCollector,
+    "ProductCategory": ProductCategoryCollector,
+    "Product": ProductCollector,
+    "OrderDetail": OrderDetailCollector,
+}
+
+
+class DimensionRegistry:
+    # In-memory name -> ID maps for the dimension tables of one normalized
+    # database. The insert steps fill it as they assign IDs and the lookup steps
+    # (step2/4/6/8/10) read from it; a map that was never set is read from the
+    # database once and then kept.
+
+    def __init__(self, normalized_database_filename):
+        self.normalized_database_filename = normalized_database_filename
+        self.id_maps = {}
+
+    def set(self, table, id_map):
+        self.id_maps[table] = id_map
+
+    def get(self, table):
+        if table not in self.id_maps:
+            db_lookup = DIMENSION_LOOKUPS[table]
+            self.id_maps[table] = db_lookup(self.normalized_database_filename)
+        return self.id_maps[table]
+
+    def clear(self):
+        self.id_maps.clear()
+
+
+@profiled
+def scan_data_file(data_filename, collectors, workers=None, end=None):
+    # Read data_filename once (up to byte end, if given), handing every
+    # tab-split row to each collector.
+    # With workers > 1 the file is parsed in line-aligned byte ranges by a
+    # process pool and the partial collectors are merged back in file order,
+    # which keeps first-seen and sort order (and so every ID) unchanged.
+    if workers is None or workers <= 1:
+        scan_data_rows(data_filename, collectors, end=end)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    tables = [collector.table for collector in collectors]
+    shards = data_file_shards(data_filename, workers, end=end)
+    profile = _build_profiler is not None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(scan_data_shard, data_filename, start, end, tables, profile)
+                   for start, end in shards]
+        for future in futures:
+            parts, counts = future.result()
+            for collector, part in zip(collectors, parts):
+                collector.merge(part)
+            for name, n in counts.items():
+                profile_count(name, n)
+
+
+def scan_data_rows(data_filename, collectors, start=None, end=None):
+    # Hands every data row of data_filename, or of the lines in the byte range
+    # [start, end), to the collectors
+    rows_in = 0
+    parser = collector_parser(collectors)
+    for rows_in, parts in enumerate(iter_data_rows(data_filename, parser, start=start, end=end), 1):
+        dispatch_row(collectors, parts)
+    profile_count("rows_in", rows_in)
+
+
+def data_file_shards(data_filename, count, end=None):
+    # Splits the data rows of data_filename (everything after the header, up
+    # to byte end if given) into at most count (start, end) byte ranges that
+    # begin and end on line starts
+    import os
+    size = os.path.getsize(data_filename) if end is None else end
+    with open(data_filename, 'rb') as f:
+        f.readline()
+        first = f.tell()
+        bounds = [first]
+        for i in range(1, count):
+            f.seek(max(first + (size - first) * i // count, bounds[-1]))
+            f.readline()
+            if f.tell() >= size:
+                break
+            if f.tell() > bounds[-1]:
+                bounds.append(f.tell())
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def scan_data_shard(data_filename, start, end, tables, profile=False):
+    # Process-pool worker: collects tables from the lines in [start, end).
+    # Returns the collectors and, with profile, the profile_count counters
+    # recorded while scanning (a forked worker must not add to its copy of
+    # the parent's profiler, so it always runs under its own or none).
+    global _build_profiler
+    _build_profiler = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    collectors = [COLLECTORS[t]() for t in tables]
+    if not profile:
+        scan_data_rows(data_filename, collectors, start=start, end=end)
+        return collectors, {}
+    with BuildProfiler(name="scan_data_shard", trace_memory=False) as profiler:
+        scan_data_rows(data_filename, collectors, start=start, end=end)
+    return collectors, profiler.root.counts
+
+
+def iter_data_rows(data_filename, parser, start=None, end=None):
+    # Yields parser.parse of every data row in data_filename, or of the lines
+    # in the byte range [start, end). The file is memory-mapped, so lines are
+    # sliced from the page cache as raw bytes.
+    import mmap
+    import os
+    with open(data_filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if start is None:
+                mm.readline()
+            else:
+                mm.seek(start)
+            if end is None:
+                lines = iter(mm.readline, b'')
+            else:
+                lines = iter(lambda: mm.readline() if mm.tell() < end else b'', b'')
+            for line in lines:
+                yield parser.parse(line)
+
+
+def iter_orderdetail_rows(data_filename, custtocustid, prodtoprodid, end=None):
+    # Streams OrderDetail tuples straight from data_filename (up to byte end,
+    # if given) without holding them
+    parser = collector_parser([OrderDetailCollector])
+    for parts in iter_data_rows(data_filename, parser, end=end):
+        if len(parts) < OrderDetailCollector.min_columns:
+            profile_count("OrderDetail.skipped_short_row")
+            continue
+        yield from resolve_order_lines(parse_order_lines(parts), custtocustid, prodtoprodid)
+
+
+@profiled
+def load_orderdetail_table(conn, orderrows, batch_size=ORDERDETAIL_BATCH_SIZE, verbose=False):
+    # Inputs: Open connection, iterable of OrderDetail tuples and the number of
+    #         rows to insert per executemany call
+    # Output: Number of rows inserted
+    # All batches share one transaction, so only batch_size rows are ever held.
+    import itertools
+    orderrows = iter(orderrows)
+    create_table(conn, OrderDetailCollector.create_table_sql, drop_table_name="OrderDetail")
+    total = 0
+    with conn:
+        while True:
+            start = time.perf_counter()
+            batch = list(itertools.islice(orderrows, batch_size))
+            if not batch:
+                break
+            conn.executemany(OrderDetailCollector.insert_sql, batch)
+            total += len(batch)
+            if verbose:
+                elapsed = time.perf_counter() - start
+                print(f"OrderDetail batch: {len(batch)} rows in {elapsed:.3f}s "
+                      f"({len(batch) / max(elapsed, 1e-9):.0f} rows/s, {total} total)")
+    profile_count("OrderDetail.rows_out", total)
+    return total
+
+
+@profiled
+def build_normalized_database(data_filename, normalized_database_filename, tables=None, verbose=False,
+                              registry=None, orderdetail_batch_size=None, bulk=False, workers=None,
+                              profile_report=None, end=None):
+    # Inputs: Name of the data and normalized database filename, optionally the
+    #         subset of NORMALIZED_TABLES to (re)build and a DimensionRegistry
+    #         shared with the other steps of the build. With an
+    #         orderdetail_batch_size, OrderDetail is not collected during the
+    #         scan but streamed from a second read in batches of that size.
+    #         bulk=True loads under BULK_LOAD_PRAGMAS and verifies foreign
+    #         keys once at the end (see finish_bulk_load).
+    #         workers > 1 parses data_filename in that many processes.
+    #         profile_report names a JSON file for a BuildProfiler report of
+    #         this build.
+    #         end stops reading data_filename at that byte offset (a line
+    #         start), e.g. before a last line that is still being written.
+    # Output: Dictionary of per-stage wall-clock timings in seconds
+    if profile_report is not None:
+        with BuildProfiler(profile_report):
+            return build_normalized_database(data_filename, normalized_database_filename, tables=tables,
+                                             verbose=verbose, registry=registry,
+                                             orderdetail_batch_size=orderdetail_batch_size, bulk=bulk,
+                                             workers=workers, end=end)
+    tables = [t for t in NORMALIZED_TABLES if t in (tables or NORMALIZED_TABLES)]
+    stream_orders = orderdetail_batch_size is not None and "OrderDetail" in tables
+    timings = {}
+    build_start = time.perf_counter()
+
+    collectors = [COLLECTORS[t]() for t in tables if not (stream_orders and t == "OrderDetail")]
+    # Streaming OrderDetail alone (step11) needs no scan before its own read
+    if collectors:
+        start = time.perf_counter()
+        scan_data_file(data_filename, collectors, workers=workers, end=end)
+        timings["parse"] = time.perf_counter() - start
+
+    # Parent ID maps come from the registry when an earlier stage (or an earlier
+    # step sharing the registry) built the parent table, otherwise from the database.
+    if registry is None:
+        registry = DimensionRegistry(normalized_database_filename)
+
+    # Rebuilding Region starts a fresh database, as step1 always has
+    fresh = "Region" in tables
+    if fresh:
+        registry.clear()
+    conn = create_connection(normalized_database_filename, delete_db=fresh, foreign_keys=False, bulk=bulk)
+    try:
+        for collector in collectors:
+            start = time.perf_counter()
+            with profile_span(f"{collector.table}.rows"):
+                rows = collector.rows(registry.get)
+            create_table(conn, collector.create_table_sql, drop_table_name=collector.table)
+            with profile_span(f"{collector.table}.executemany"):
+                rows_out = conn.executemany(collector.insert_sql, rows).rowcount
+                profile_count(f"{collector.table}.rows_out", rows_out)
+            with profile_span(f"{collector.table}.commit"):
+                conn.commit()
+            id_map = collector.id_map(rows)
+            if id_map is not None:
+                registry.set(collector.table, id_map)
+            timings[collector.table] = time.perf_counter() - start
+
+        if stream_orders:
+            start = time.perf_counter()
+            orderrows = iter_orderdetail_rows(data_filename, registry.get("Customer"), registry.get("Product"),
+                                              end=end)
+            load_orderdetail_table(conn, orderrows, batch_size=orderdetail_batch_size, verbose=verbose)
+            timings["OrderDetail"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        create_indexes(conn, tables)
+        timings["indexes"] = time.perf_counter() - start
+
+        if "OrderDetail" in tables:
+            start = time.perf_counter()
+            build_order_date_parts(conn)
+            timings["dateparts"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            build_sales_rollups(conn, verbose=verbose)
+            timings["rollups"] = time.perf_counter() - start
+
+        if bulk:
+            start = time.perf_counter()
+            finish_bulk_load(conn, foreign_keys=False)
+            timings["finish_bulk_load"] = time.perf_counter() - start
+    finally:
+        conn.close()
+
+    timings["total"] = time.perf_counter() - build_start
+    if verbose:
+        for stage, seconds in timings.items():
+            print(f"{stage}: {seconds:.3f}s")
+    return timings
+
+
+### Incremental Ingest
+# data.csv exports only ever grow by appended lines. IngestState remembers how
+# many bytes of the file are already in the database and a hash of the bytes
+# just before that high-water mark, so an unchanged file costs one stat and
+# one small read, and an appended one only parses the new lines.
+
+INGEST_TAIL_BYTES = 65536
+
+create_ingest_state_sql = """
+CREATE TABLE IF NOT EXISTS IngestState(
+  DataFilename TEXT PRIMARY KEY,
+  ByteOffset INTEGER NOT NULL,
+  TailHash TEXT NOT NULL
+);
+"""
+
+
+def data_file_tail_hash(data_filename, offset):
+    # Hash of the INGEST_TAIL_BYTES bytes ending at offset
+    import hashlib
+    with open(data_filename, 'rb') as f:
+        start = max(0, offset - INGEST_TAIL_BYTES)
+        f.seek(start)
+        return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+
+def save_ingest_state(conn, data_filename, offset):
+    create_table(conn, create_ingest_state_sql)
+    conn.execute("INSERT OR REPLACE INTO IngestState(DataFilename,ByteOffset,TailHash) VALUES(?,?,?)",
+                 (data_filename, offset, data_file_tail_hash(data_filename, offset)))
+
+
+def data_file_complete_end(data_filename):
+    # Byte offset just past the last newline of data_filename (0 without one).
+    # A last line without its newline is still being written, so ingests
+    # stop there and pick it up once it is complete.
+    import os
+    size = os.path.getsize(data_filename)
+    with open(data_filename, 'rb') as f:
+        end = size
+        while end > 0:
+            start = max(0, end - INGEST_TAIL_BYTES)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline >= 0:
+                return start + newline + 1
+            end = start
+    return 0
+
+
+def load_ingest_state(normalized_database_filename, data_filename):
+    # Output: (ByteOffset, TailHash) recorded for data_filename, or None
+    import os
+    if not os.path.exists(normalized_database_filename):
+        return None
+    conn = sqlite3.connect(normalized_database_filename)
+    try:
+        return conn.execute("SELECT ByteOffset,TailHash FROM IngestState WHERE DataFilename=?",
+                            (data_filename,)).fetchone()
+    except Error:
+        return None
+    finally:
+        conn.close()
+
+
+def customer_row(conn, customer_id):
+    # The Customer row of customer_id as CustomerCollector.rows gives it
+    return conn.execute("SELECT FirstName,LastName,Address,City,CountryID FROM Customer WHERE CustomerID=?",
+                        (customer_id,)).fetchone()
+
+
+def repoint_customer(conn, old_id, new_id):
+    # Moves the orders of customer old_id, and their SalesRollup months, to
+    # new_id (a customer without orders yet)
+    conn.execute("UPDATE OrderDetail SET CustomerID=? WHERE CustomerID=?", (new_id, old_id))
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='SalesRollup'").fetchone():
+        conn.execute("""
+        UPDATE SalesRollup SET
+          CustomerID=Customer.CustomerID, CountryID=Customer.CountryID, RegionID=Country.RegionID
+        FROM Customer JOIN Country ON Customer.CountryID=Country.CountryID
+        WHERE Customer.CustomerID=? AND SalesRollup.CustomerID=?
+        """, (new_id, old_id))
+
+
+@profiled
+def ingest_incremental(data_filename, normalized_database_filename, verbose=False):
+    # Inputs: Name of the data and normalized database filename
+    # Output: Dictionary with the ingest mode ("unchanged", "incremental" or
+    #         "full") and the number of rows added to each table
+    # Lines appended since the last ingest add any new regions, countries,
+    # customers, categories and products (existing IDs are kept, see below
+    # for customers) and append their OrderDetail rows. If the already-ingested part of the file changed,
+    # the database is rebuilt from scratch.
+    import os
+    size = os.path.getsize(data_filename)
+    state = load_ingest_state(normalized_database_filename, data_filename)
+    # An offset of 0 means not even the header was complete, so nothing is in
+    # the database yet
+    appended = (state is not None and 0 < state[0] <= size
+                and data_file_tail_hash(data_filename, state[0]) == state[1])
+
+    if appended and size == state[0]:
+        summary = {"mode": "unchanged"}
+    elif not appended:
+        end = data_file_complete_end(data_filename)
+        build_normalized_database(data_filename, normalized_database_filename, verbose=verbose, end=end)
+        conn = create_connection(normalized_database_filename)
+        with conn:
+            save_ingest_state(conn, data_filename, end)
+        conn.close()
+        summary = {"mode": "full"}
+    else:
+        collectors = [COLLECTORS[t]() for t in NORMALIZED_TABLES]
+        end = data_file_complete_end(data_filename)
+        if end > state[0]:
+            scan_data_rows(data_filename, collectors, start=state[0], end=end)
+
+        registry = DimensionRegistry(normalized_database_filename)
+        summary = {"mode": "incremental"}
+        conn = create_connection(normalized_database_filename)
+        with conn:
+            for collector in collectors:
+                rows = collector.rows(registry.get)
+                if collector.table == "OrderDetail":
+                    summary[collector.table] = conn.executemany(collector.insert_sql, rows).rowcount
+                    continue
+                # Upsert: only keys the dimension has never seen get a new ID,
+                # except a customer line that differs from the row its name
+                # maps to. A rebuild inserts every customer line and maps the
+                # name to the last one, so that line is inserted and the name's
+                # orders are moved onto it.
+                id_map = registry.get(collector.table)
+                added = 0
+                for row in rows:
+                    key = collector.key(row)
+                    old_id = id_map.get(key)
+                    if old_id is not None and not (collector.table == "Customer"
+                                                   and customer_row(conn, old_id) != tuple(row)):
+                        continue
+                    id_map[key] = conn.execute(collector.insert_sql, row).lastrowid
+                    if old_id is not None:
+                        repoint_customer(conn, old_id, id_map[key])
+                    added += 1
+                summary[collector.table] = added
+            save_ingest_state(conn, data_filename, end)
+        conn.close()
+
+    if verbose:
+        print(summary)
+    return summary
+
+
+@profiled
+def step1_create_region_table(data_filename, normalized_database_filename, registry=None, bulk=False):
+    # Inputs: Name of the data and normalized database filename
+    # Output: None
+
+# WRITE YOUR CODE HERE
+  build_normalized_database(data_filename, normalized_database_filename, tables=["Region"], registry=registry,
+                            bulk=bulk)
 
 
-def step2_create_region_to_regionid_dictionary(normalized_database_filename):
+@profiled
+def step2_create_region_to_regionid_dictionary(normalized_database_filename, registry=None):
+  if registry is not None:
+    return registry.get("Region")
   pass
   conn=sqlite3.connect(normalized_database_filename)
   cursor=conn.cursor()
@@ -98,56 +1187,21 @@ def step2_create_region_to_regionid_dictionary(normalized_database_filename):
 # WRITE YOUR CODE HERE
 
 
-def step3_create_country_table(data_filename,normalized_database_filename):
-    
+@profiled
+def step3_create_country_table(data_filename,normalized_database_filename, registry=None, bulk=False):
+
     # Inputs: Name of the data and normalized database filename
     # Output: None
-    pass
-    distinct_countries=set()
-    with open(data_filename,'r') as file:
-      next(file)
-      for line in file:
-        parts=line.strip().split('\t')
-        country=parts[3].strip()
-        region=parts[4].strip()
-        distinct_countries.add((country,region))
-
-    sorted_countries=sorted(distinct_countries,key=lambda x:x[0])
-
-    conn=sqlite3.connect(normalized_database_filename)
-    cursor=conn.cursor()
-
-    create_table_sql= """ 
-    CREATE TABLE Country(
-      CountryID INTEGER PRIMARY KEY AUTOINCREMENT,
-      CountryName TEXT NOT NULL,
-      RegionID INTEGER NOT NULL,
-      FOREIGN KEY (RegionID) REFERENCES Region (RegionID)
-
-    );
-
-    """
-    create_table(conn,create_table_sql,drop_table_name="Country")
-
-    rr=step2_create_region_to_regionid_dictionary(normalized_database_filename)
-
-    insert_sql="INSERT INTO Country (CountryName,RegionID) VALUES(?,?)"
-
-    country_rows=[]
-
-    for country,region in sorted_countries:
-      region_id=rr[region]
-      country_rows.append((country,region_id))
-
-    cursor.executemany(insert_sql,country_rows)
-
-    conn.commit()
-    conn.close()
+    build_normalized_database(data_filename, normalized_database_filename, tables=["Country"], registry=registry,
+                              bulk=bulk)
 
 # WRITE YOUR CODE HERE
 
 
-def step4_create_country_to_countryid_dictionary(normalized_database_filename):
+@profiled
+def step4_create_country_to_countryid_dictionary(normalized_database_filename, registry=None):
+  if registry is not None:
+    return registry.get("Country")
   pass
   conn=sqlite3.connect(normalized_database_filename)
   cursor=conn.cursor()
@@ -161,66 +1215,17 @@ def step4_create_country_to_countryid_dictionary(normalized_database_filename):
 # WRITE YOUR CODE HERE
         
         
-def step5_create_customer_table(data_filename, normalized_database_filename):
-  pass
-  ctocid=step4_create_country_to_countryid_dictionary(normalized_database_filename)
-  customers=[]
-
-  with open(data_filename,'r') as file:
-    next(file)
-    for line in file:
-      parts=line.strip().split('\t')
-
-      name=parts[0].strip()
-      address=parts[1].strip()
-      city=parts[2].strip()
-      country=parts[3].strip()
-
-      try:
-        fname,lname=name.split(" ",1)
-      except:
-        continue
-
-      try:
-        country_id=ctocid[country]
-      except KeyError:
-        continue
-
-      customers.append((fname,lname,address,city,country_id))
-  
-  customers.sort(key=lambda x: (x[0],x[1]))
-
-
-     
-
-  conn=sqlite3.connect(normalized_database_filename)
-  
-  create_table_sql=""" 
-  CREATE TABLE Customer(
-    CustomerID INTEGER PRIMARY KEY AUTOINCREMENT,
-    FirstName TEXT NOT NULL,
-    LastName TEXT NOT NULL,
-    Address TEXT NOT NULL,
-    City TEXT NOT NULL,
-    CountryID INTEGER NOT NULL,
-    FOREIGN KEY (CountryID) REFERENCES Country(CountryID)
-
-  );
-  
-  """
-  create_table(conn,create_table_sql,drop_table_name="Customer")
-  insert_sql=""" 
-  INSERT INTO Customer(FirstName,LastName,Address,City,CountryID)
-  VALUES(?,?,?,?,?)
-  """
-  with conn:
-    conn.executemany(insert_sql,customers)
-
-  conn.close()
+@profiled
+def step5_create_customer_table(data_filename, normalized_database_filename, registry=None, bulk=False):
+  build_normalized_database(data_filename, normalized_database_filename, tables=["Customer"], registry=registry,
+                            bulk=bulk)
 # WRITE YOUR CODE HERE
 
 
-def step6_create_customer_to_customerid_dictionary(normalized_database_filename):
+@profiled
+def step6_create_customer_to_customerid_dictionary(normalized_database_filename, registry=None):
+  if registry is not None:
+    return registry.get("Customer")
   pass
   
   conn=sqlite3.connect(normalized_database_filename)
@@ -239,53 +1244,18 @@ def step6_create_customer_to_customerid_dictionary(normalized_database_filename)
 
 # WRITE YOUR CODE HERE
         
-def step7_create_productcategory_table(data_filename, normalized_database_filename):
+@profiled
+def step7_create_productcategory_table(data_filename, normalized_database_filename, registry=None, bulk=False):
     # Inputs: Name of the data and normalized database filename
     # Output: None
-  
-  seen=set()
-  distinct=[]
-  with open(data_filename,'r',encoding='utf-8') as f:
-    next(f)
-    for line in f:
-      parts=line.strip().split("\t")
-      if len(parts)<8:
-        continue
-
-      categories=parts[6].split(";")
-      description=parts[7].split(";")
-
-      for cat,desc in zip(categories,description):
-        cat=cat.strip()
-        desc=desc.strip()
-
-        if cat and cat not in seen:
-          distinct.append((cat,desc))
-          seen.add(cat)
-
-  distinct.sort(key=lambda x: x[0])
-
-  conn=sqlite3.connect(normalized_database_filename)
-  cursor=conn.cursor()
-  cursor.execute("DROP TABLE IF EXISTS ProductCategory")
-  create_table_sql=""" 
-  CREATE TABLE ProductCategory(
-    ProductCategoryID INTEGER PRIMARY KEY AUTOINCREMENT,
-    ProductCategory TEXT NOT NULL,
-    ProductCategoryDescription TEXT NOT NULL
-  );
-  """
-  cursor.execute(create_table_sql)
-  insert_sql=""" 
-  INSERT INTO ProductCategory(ProductCategory,ProductCategoryDescription) VALUES(?,?)
-
-  """
-  with conn:
-    conn.executemany(insert_sql,distinct)
-  conn.close()
+  build_normalized_database(data_filename, normalized_database_filename, tables=["ProductCategory"], registry=registry,
+                            bulk=bulk)
 # WRITE YOUR CODE HERE
 
-def step8_create_productcategory_to_productcategoryid_dictionary(normalized_database_filename):
+@profiled
+def step8_create_productcategory_to_productcategoryid_dictionary(normalized_database_filename, registry=None):
+  if registry is not None:
+    return registry.get("ProductCategory")
   conn=sqlite3.connect(normalized_database_filename)
   cursor=conn.cursor()
 
@@ -301,70 +1271,20 @@ def step8_create_productcategory_to_productcategoryid_dictionary(normalized_data
 # WRITE YOUR CODE HERE
         
 
-def step9_create_product_table(data_filename, normalized_database_filename):
+@profiled
+def step9_create_product_table(data_filename, normalized_database_filename, registry=None, bulk=False):
     # Inputs: Name of the data and normalized database filename
     # Output: None
-  prodcatdict=step8_create_productcategory_to_productcategoryid_dictionary(normalized_database_filename)
-  seen=set()
-  distinct_products=[]
-  with open(data_filename,'r',encoding='utf-8') as f:
-    next(f)
-    for line in f:
-      parts=line.strip().split('\t')
-      if len(parts)<9:
-        continue
-
-      product_names=parts[5].split(";")
-      categories=parts[6].split(";")
-      unitprstr=parts[8].split(";")
-      for p,c,pr in zip(product_names,categories,unitprstr):
-        pname=p.strip()
-        catname=c.strip()
-        try:
-          unitprice=float(pr.strip())
-          #categoryid=step8_create_productcategory_to_productcategoryid_dictionary.get(catname)
-        except(ValueError,TypeError):
-          continue
-        
-        categoryid=prodcatdict.get(catname)
-
-        if categoryid is None:
-          continue
-        key=(pname,categoryid)
-        if key not in seen:
-          distinct_products.append((pname,unitprice,categoryid))
-          seen.add(key)
-  distinct_products.sort(key=lambda x:x[0])
-  conn=sqlite3.connect(normalized_database_filename)
-  cursor=conn.cursor()
-  cursor.execute("DROP TABLE IF EXISTS Product")
-
-  create_table_sql="""
-  CREATE TABLE Product(
-    ProductID INTEGER PRIMARY KEY AUTOINCREMENT,
-    ProductName TEXT NOT NULL,
-    ProductUnitPrice REAL NOT NULL,
-    ProductCategoryID INTEGER NOT NULL,
-    FOREIGN KEY (ProductCategoryID) REFERENCES ProductCategory(ProductCategoryID)
-  );
-   """
-
-  cursor.execute(create_table_sql)
-
-  insert_sql="""
-  INSERT INTO Product(ProductName,ProductUnitPrice, ProductCategoryID) VALUES(?,?,?)
+  build_normalized_database(data_filename, normalized_database_filename, tables=["Product"], registry=registry,
+                            bulk=bulk)
 
-   """
-  with conn:
-    conn.executemany(insert_sql,distinct_products)
-  conn.close()
-  
-  pass
-    
 # WRITE YOUR CODE HERE
 
 
-def step10_create_product_to_productid_dictionary(normalized_database_filename):
+@profiled
+def step10_create_product_to_productid_dictionary(normalized_database_filename, registry=None):
+  if registry is not None:
+    return registry.get("Product")
   pass
   conn=sqlite3.connect(normalized_database_filename)
   cursor=conn.cursor()
@@ -374,96 +1294,48 @@ def step10_create_product_to_productid_dictionary(normalized_database_filename):
   product_to_productid_dict={name: pid for pid,name in rows}
   return product_to_productid_dict
 
+
+# Database fallbacks used by DimensionRegistry for maps it has not been handed
+DIMENSION_LOOKUPS = {
+  "Region": step2_create_region_to_regionid_dictionary,
+  "Country": step4_create_country_to_countryid_dictionary,
+  "Customer": step6_create_customer_to_customerid_dictionary,
+  "ProductCategory": step8_create_productcategory_to_productcategoryid_dictionary,
+  "Product": step10_create_product_to_productid_dictionary,
+}
+
 # WRITE YOUR CODE HERE
         
 
-def step11_create_orderdetail_table(data_filename, normalized_database_filename):
+@profiled
+def step11_create_orderdetail_table(data_filename, normalized_database_filename, registry=None,
+                                    batch_size=None, verbose=False, bulk=False):
     # Inputs: Name of the data and normalized database filename
     # Output: None
-  import datetime
-  prodtoprodid=step10_create_product_to_productid_dictionary(normalized_database_filename)
-  custtocustid=step6_create_customer_to_customerid_dictionary(normalized_database_filename)
-
-  orderrows=[]
-  with open(data_filename,'r',encoding='utf-8') as f:
-    next(f)
-    for line in f:
-      line_parts=line.strip().split("\t")
-      if len(line_parts)<11:
-        continue
-      
-      nameraw=line_parts[0].strip()
-      try:
-        #parts=name.strip().split(" ",1)
-        first,last=nameraw.split(" ",1)
-        fullnamekey=f"{first.strip()} {last.strip()}"
-
-        customer_id=custtocustid.get(fullnamekey)
-      except ValueError:
-        continue
-      if customer_id is None:
-        continue
-      
-      product_names=line_parts[5].split(";")
-      product_categories=line_parts[6].split(";")
-      product_desc=line_parts[7].split(";")
-      unitprice=line_parts[8].split(";")
-      quantities=line_parts[9].split(";")
-      dates=line_parts[10].split(";")
-
-      for pname,qty,od in zip(product_names,quantities,dates):
-        pname=pname.strip()
-        qty=qty.strip()
-        od=od.strip()
-
-        prodid=prodtoprodid.get(pname)
-
-        if prodid is None:
-          continue
+    # Pass batch_size to stream the rows in bounded batches instead of collecting them
+  build_normalized_database(data_filename, normalized_database_filename, tables=["OrderDetail"], registry=registry,
+                            orderdetail_batch_size=batch_size, verbose=verbose, bulk=bulk)
+# WRITE YOUR CODE HERE
 
-        
 
-        try:
-          qtyval=int(qty)
 
-        except ValueError:
-          continue
-
-        try:
-          orderdate=datetime.datetime.strptime(od,"%Y%m%d").strftime("%Y-%m-%d")
-        except ValueError:
-          continue
-        orderrows.append((customer_id,prodid,orderdate,qtyval))
 
-        
-  conn=sqlite3.connect(normalized_database_filename)
-  cursor=conn.cursor()
-  cursor.execute("DROP TABLE IF EXISTS OrderDetail")
-
-  create_table_sql=""" 
-  CREATE TABLE OrderDetail(
-    OrderID INTEGER PRIMARY KEY AUTOINCREMENT,
-    CustomerID INTEGER NOT NULL,
-    ProductID INTEGER NOT NULL,
-    OrderDate TEXT NOT NULL,
-    QuantityOrdered INTEGER NOT NULL,
-    FOREIGN KEY(CustomerID) REFERENCES Customer(CustomerID),
-    FOREIGN KEY(ProductID) REFERENCES Product(ProductID)
-  );
-  
-  """
 
-  cursor.execute(create_table_sql)
-  insert_sql=""" 
-  INSERT INTO OrderDetail(CustomerID,ProductID,OrderDate,QuantityOrdered) VALUES(?,?,?,?)
-  """
-  with conn:
-    conn.executemany(insert_sql,orderrows)
+resolve_customer_id_sql = "SELECT MAX(CustomerID) FROM Customer WHERE FirstName=? AND LastName=?"
 
-  conn.close()
-  pass
-# WRITE YOUR CODE HERE
 
+def resolve_customer_id(conn, CustomerName):
+    # Resolves "FirstName LastName" to its CustomerID on the caller's connection
+    # through idx_Customer_Name. A repeated name resolves to its highest ID, as
+    # in step6's dictionary; an unknown name raises KeyError like it did.
+    try:
+        fname, lname = CustomerName.split(" ", 1)
+    except ValueError:
+        raise KeyError(CustomerName)
+    row = conn.execute(resolve_customer_id_sql, (fname, lname)).fetchone()
+    if row[0] is None:
+        raise KeyError(CustomerName)
+    return row[0]
 
 def ex1(conn, CustomerName):
     
@@ -478,11 +1350,18 @@ def ex1(conn, CustomerName):
     # Total -- which is calculated from multiplying ProductUnitPrice with QuantityOrdered -- round to two decimal places
     # HINT: USE customer_to_customerid_dict to map customer name to customer id and then use where clause with CustomerID
     pass
-    from mini_project2 import step6_create_customer_to_customerid_dictionary
-    cdict=step6_create_customer_to_customerid_dictionary('normalized.db')
-    cid=cdict[CustomerName]
+    sql_statement, (cid,) = ex1_query(conn, CustomerName)
 
-    sql_statement = f"""
+# WRITE YOUR CODE HERE
+    return sql_statement.replace("?", str(cid))
+
+def ex1_query(conn, CustomerName):
+    # ex1 with the CustomerID as a bound parameter: the SQL text is the same
+    # for every customer, so the connection's statement cache can reuse it.
+    # Output: (sql_statement, parameters)
+    cid=resolve_customer_id(conn, CustomerName)
+
+    sql_statement = """
     SELECT 
       Customer.FirstName || ' ' || Customer.LastName AS Name,
       Product.ProductName,
@@ -493,16 +1372,11 @@ def ex1(conn, CustomerName):
     FROM OrderDetail
     JOIN Customer ON OrderDetail.CustomerID=Customer.CustomerID
     JOIN Product ON OrderDetail.ProductID=Product.ProductID
-    WHERE Customer.CustomerID={cid};
+    WHERE Customer.CustomerID=?;
     """
-
-# WRITE YOUR CODE HERE
-    return sql_statement
+    return sql_statement, (cid,)
 
 def ex2(conn, CustomerName):
-    from mini_project2 import step6_create_customer_to_customerid_dictionary
-    cdict=step6_create_customer_to_customerid_dictionary('normalized.db')
-    cid=cdict[CustomerName]
     # Simply, you are summing the total for a given CustomerName. 
     # Write an SQL statement that SELECTs From the OrderDetail table and joins with the Customer and Product table.
     # Pull out the following columns. 
@@ -510,17 +1384,25 @@ def ex2(conn, CustomerName):
     # Total -- which is calculated from multiplying ProductUnitPrice with QuantityOrdered -- sum first and then round to two decimal places
     # HINT: USE customer_to_customerid_dict to map customer name to customer id and then use where clause with CustomerID
     pass
-    sql_statement = f"""
+    sql_statement, (cid,) = ex2_query(conn, CustomerName)
+# WRITE YOUR CODE HERE
+    return sql_statement.replace("?", str(cid))
+
+def ex2_query(conn, CustomerName):
+    # ex2 with the CustomerID as a bound parameter (see ex1_query)
+    # Output: (sql_statement, parameters)
+    cid=resolve_customer_id(conn, CustomerName)
+
+    sql_statement = """
     SELECT Customer.FirstName || ' ' || Customer.LastName AS Name,
     ROUND(SUM(Product.ProductUnitPrice*OrderDetail.QuantityOrdered),2) AS Total
     FROM OrderDetail
     JOIN Customer ON OrderDetail.CustomerID=Customer.CustomerID
     JOIN Product ON OrderDetail.ProductID=Product.ProductID
-    WHERE Customer.CustomerID={cid}
+    WHERE Customer.CustomerID=?
     GROUP BY Customer.FirstName,Customer.LastName;
     """
-# WRITE YOUR CODE HERE
-    return sql_statement
+    return sql_statement, (cid,)
 
 def ex3(conn):
     pass
@@ -806,4 +1688,849 @@ def ex11(conn):
     ORDER BY MaxDays.MaxDaysWithoutOrder DESC, DaysBW.CustomerID DESC
     """
 # WRITE YOUR CODE HERE
-    return sql_statement
\ No newline at end of file
+    return sql_statement
+
+
+### Sales Rollups
+# ex3-ex10 all re-sum ProductUnitPrice*QuantityOrdered over the whole
+# OrderDetail/Product join. SalesRollup keeps those sums per customer and
+# calendar month, with the customer's country and region attached, so the
+# rollup variants below only read a few rows per customer and month. The
+# month is stored as ex10 reads it and the quarter as ex8/ex9 do, like
+# OrderDetailDate's (0 for no month, as a key column cannot be NULL).
+# Revenue is kept in whole cents so that re-adding the monthly sums gives
+# exactly the total of the order lines, whatever the grouping. exN itself
+# adds floats, so its SUM is off from the exact cents by rounding error.
+# That cannot change a total rounded to cents (ex3, ex4) or a sum of whole
+# numbers (ex10), so those variants give identical results. ex5-ex9 round to
+# whole units, and an exact X.50 total rounds up here where exN's float SUM
+# may land just below it. Those variants are kept apart as "rollup_cents".
+# Once built,
+# a trigger folds every later OrderDetail insert into its month in the same
+# transaction, and check_sales_rollups compares it with a full recompute.
+
+create_sales_rollup_sql = """
+CREATE TABLE SalesRollup(
+  CustomerID INTEGER NOT NULL,
+  CountryID INTEGER NOT NULL,
+  RegionID INTEGER NOT NULL,
+  OrderYear INTEGER NOT NULL,
+  OrderQuarter INTEGER NOT NULL,
+  OrderMonth INTEGER NOT NULL,
+  RevenueCents INTEGER NOT NULL,
+  RoundedRevenue INTEGER NOT NULL,
+  PRIMARY KEY (CustomerID, OrderYear, OrderQuarter, OrderMonth)
+) WITHOUT ROWID;
+"""
+
+# RoundedRevenue is SUM(ROUND(ProductUnitPrice*QuantityOrdered)), which ex10
+# totals instead of the plain revenue
+recompute_sales_rollup_sql = """
+SELECT
+  OrderDetail.CustomerID,
+  Customer.CountryID,
+  Country.RegionID,
+  CAST(SUBSTR(OrderDetail.OrderDate,1,4) AS INTEGER),
+  CASE WHEN CAST(SUBSTR(OrderDetail.OrderDate,6,2) AS INTEGER) BETWEEN 1 AND 12
+  THEN (CAST(SUBSTR(OrderDetail.OrderDate,6,2) AS INTEGER)+2)/3 ELSE 4 END,
+  CASE WHEN SUBSTR(OrderDetail.OrderDate,6,2) GLOB '[01][0-9]' AND SUBSTR(OrderDetail.OrderDate,6,2) BETWEEN '01' AND '12'
+  THEN CAST(SUBSTR(OrderDetail.OrderDate,6,2) AS INTEGER) ELSE 0 END,
+  SUM(CAST(ROUND(Product.ProductUnitPrice*100) AS INTEGER)*OrderDetail.QuantityOrdered),
+  SUM(CAST(ROUND(Product.ProductUnitPrice*OrderDetail.QuantityOrdered) AS INTEGER))
+FROM OrderDetail
+JOIN Product ON OrderDetail.ProductID=Product.ProductID
+JOIN Customer ON OrderDetail.CustomerID=Customer.CustomerID
+JOIN Country ON Customer.CountryID=Country.CountryID
+GROUP BY 1, 4, 5, 6
+"""
+
+populate_sales_rollup_sql = """
+INSERT INTO SalesRollup(CustomerID,CountryID,RegionID,OrderYear,OrderQuarter,OrderMonth,RevenueCents,RoundedRevenue)
+""" + recompute_sales_rollup_sql
+
+# The per-row delta is the single-line version of recompute_sales_rollup_sql
+create_sales_rollup_trigger_sql = """
+CREATE TRIGGER SalesRollup_OrderDetail_Insert AFTER INSERT ON OrderDetail
+BEGIN
+  INSERT INTO SalesRollup(CustomerID,CountryID,RegionID,OrderYear,OrderQuarter,OrderMonth,RevenueCents,RoundedRevenue)
+  SELECT
+    NEW.CustomerID,
+    Customer.CountryID,
+    Country.RegionID,
+    CAST(SUBSTR(NEW.OrderDate,1,4) AS INTEGER),
+    CASE WHEN CAST(SUBSTR(NEW.OrderDate,6,2) AS INTEGER) BETWEEN 1 AND 12
+    THEN (CAST(SUBSTR(NEW.OrderDate,6,2) AS INTEGER)+2)/3 ELSE 4 END,
+    CASE WHEN SUBSTR(NEW.OrderDate,6,2) GLOB '[01][0-9]' AND SUBSTR(NEW.OrderDate,6,2) BETWEEN '01' AND '12'
+    THEN CAST(SUBSTR(NEW.OrderDate,6,2) AS INTEGER) ELSE 0 END,
+    CAST(ROUND(Product.ProductUnitPrice*100) AS INTEGER)*NEW.QuantityOrdered,
+    CAST(ROUND(Product.ProductUnitPrice*NEW.QuantityOrdered) AS INTEGER)
+  FROM Product, Customer
+  JOIN Country ON Customer.CountryID=Country.CountryID
+  WHERE Product.ProductID=NEW.ProductID AND Customer.CustomerID=NEW.CustomerID
+  ON CONFLICT(CustomerID,OrderYear,OrderQuarter,OrderMonth) DO UPDATE SET
+    RevenueCents=RevenueCents+excluded.RevenueCents,
+    RoundedRevenue=RoundedRevenue+excluded.RoundedRevenue;
+END;
+"""
+
+
+@profiled
+def build_sales_rollups(conn, verbose=False):
+    # (Re)materializes SalesRollup from the normalized tables. Prices must be
+    # whole cents for RevenueCents to be exact; otherwise no rollup is built
+    # (verbose says why) and prepare_query answers the rollup variants with
+    # the plain exN.
+    not_cents = conn.execute(
+        "SELECT COUNT(*) FROM Product WHERE ABS(ProductUnitPrice*100 - ROUND(ProductUnitPrice*100)) > 1e-6").fetchone()[0]
+    with conn:
+        # The trigger belongs to OrderDetail, so dropping the table leaves it behind
+        conn.execute("DROP TRIGGER IF EXISTS SalesRollup_OrderDetail_Insert")
+        conn.execute("DROP TABLE IF EXISTS SalesRollup")
+        if not_cents:
+            if verbose:
+                print(f"SalesRollup not built: {not_cents} product price(s) are not whole cents")
+            return
+        conn.execute(create_sales_rollup_sql)
+        conn.execute(populate_sales_rollup_sql)
+        conn.execute(create_sales_rollup_trigger_sql)
+
+
+def check_sales_rollups(conn):
+    # Inputs: Connection to a database with SalesRollup
+    # Output: Sorted list of (CustomerID, OrderYear, OrderQuarter, OrderMonth)
+    #         keys whose maintained row is missing, extra or different from a
+    #         full recompute; empty when the rollup is consistent
+    diff = conn.execute(f"""
+    WITH Recomputed(CustomerID,CountryID,RegionID,OrderYear,OrderQuarter,OrderMonth,RevenueCents,RoundedRevenue)
+    AS ({recompute_sales_rollup_sql}),
+    Stale AS (SELECT * FROM SalesRollup EXCEPT SELECT * FROM Recomputed),
+    Missing AS (SELECT * FROM Recomputed EXCEPT SELECT * FROM SalesRollup)
+    SELECT CustomerID, OrderYear, OrderQuarter, OrderMonth FROM Stale
+    UNION
+    SELECT CustomerID, OrderYear, OrderQuarter, OrderMonth FROM Missing
+    """).fetchall()
+    return sorted(diff)
+
+
+def ex3_rollup(conn):
+    # ex3 answered from SalesRollup; ties come out latest customer first, as
+    # they do from ex3's sort
+    sql_statement = """
+    SELECT
+    Customer.FirstName || ' ' || Customer.LastName AS Name,
+    ROUND(SUM(SalesRollup.RevenueCents)/100.0,2) AS Total
+    FROM SalesRollup
+    JOIN Customer ON SalesRollup.CustomerID=Customer.CustomerID
+    GROUP BY SalesRollup.CustomerID
+    ORDER BY Total DESC, SalesRollup.CustomerID DESC;
+    """
+    return sql_statement
+
+def ex4_rollup(conn):
+    # ex4 answered from SalesRollup
+    sql_statement = """
+    SELECT Region.Region AS Region,
+    ROUND(SUM(SalesRollup.RevenueCents)/100.0,2) AS Total
+    FROM SalesRollup
+    JOIN Region ON SalesRollup.RegionID=Region.RegionID
+    GROUP BY Region.Region
+    ORDER BY Total DESC;
+    """
+    return sql_statement
+
+def ex5_rollup(conn):
+    # ex5 from SalesRollup's whole-cent totals (see "rollup_cents")
+    sql_statement = """
+    SELECT
+      Country.CountryName as Country,
+      ROUND(SUM(SalesRollup.RevenueCents)/100.0) AS Total
+    FROM SalesRollup
+    JOIN Country ON SalesRollup.CountryID=Country.CountryID
+    GROUP BY Country.CountryName
+    ORDER BY Total DESC;
+    """
+    return sql_statement
+
+def ex6_rollup(conn):
+    # ex6 from SalesRollup's whole-cent totals (see "rollup_cents")
+    sql_statement = """
+    SELECT
+      Region.Region AS Region,
+      Country.CountryName as Country,
+      ROUND(SUM(SalesRollup.RevenueCents)/100.0) As CountryTotal,
+      RANK() OVER (PARTITION BY Region.Region ORDER BY SUM(SalesRollup.RevenueCents) DESC) As TotalRank
+    FROM SalesRollup
+    JOIN Country ON SalesRollup.CountryID=Country.CountryID
+    JOIN Region ON SalesRollup.RegionID=Region.RegionID
+    GROUP BY Region.Region, Country.CountryName
+    ORDER BY Region.Region ASC, TotalRank ASC;
+    """
+    return sql_statement
+
+def ex7_rollup(conn):
+    # ex7 from SalesRollup's whole-cent totals (see "rollup_cents")
+    sql_statement = """
+    WITH RankedCountries AS(
+      SELECT
+        Region.Region,
+        Country.CountryName AS Country,
+        ROUND(SUM(SalesRollup.RevenueCents)/100.0) AS CountryTotal,
+        RANK() OVER (PARTITION BY Region.Region ORDER BY SUM(SalesRollup.RevenueCents) DESC) AS CountryRegionalRank
+      FROM SalesRollup
+      JOIN Country ON SalesRollup.CountryID=Country.CountryID
+      JOIN Region ON SalesRollup.RegionID=Region.RegionID
+      GROUP BY Region.Region,Country.CountryName
+    )
+    SELECT Region,Country,CountryTotal,CountryRegionalRank
+    FROM RankedCountries
+    WHERE CountryRegionalRank=1
+    ORDER BY Region ASC
+    """
+    return sql_statement
+
+def ex8_rollup(conn):
+    # ex8 from SalesRollup's whole-cent totals (see "rollup_cents")
+    sql_statement = """
+    WITH CustomerSales AS(
+      SELECT 'Q' || OrderQuarter AS Quarter,
+      OrderYear AS Year,
+      CustomerID,
+      ROUND(SUM(RevenueCents)/100.0) AS Total
+      FROM SalesRollup
+      GROUP BY Quarter,Year,CustomerID
+    )
+    SELECT Quarter,Year,CustomerID,Total
+    FROM CustomerSales
+    ORDER BY Year
+    """
+    return sql_statement
+
+def ex9_rollup(conn):
+    # ex9 from SalesRollup's whole-cent totals (see "rollup_cents")
+    sql_statement = """
+    WITH CustomerSales AS(
+      SELECT 'Q' || OrderQuarter AS Quarter,
+      OrderYear AS Year,
+      CustomerID,
+      ROUND(SUM(RevenueCents)/100.0) AS Total
+      FROM SalesRollup
+      GROUP BY Quarter,Year,CustomerID),
+      RankedSales AS(
+        SELECT Quarter,Year,CustomerID,Total,
+        RANK() OVER (PARTITION BY Quarter,Year ORDER BY Total DESC) AS CustomerRank
+        FROM CustomerSales
+      )
+      SELECT Quarter,Year,CustomerID,Total,CustomerRank
+      FROM RankedSales
+      WHERE CustomerRank<=5
+      ORDER BY Year
+    """
+    return sql_statement
+
+def ex10_rollup(conn):
+    # ex10 answered from SalesRollup
+    sql_statement = """
+    WITH MonthlySales AS(
+      SELECT
+      CASE OrderMonth
+      WHEN 1 THEN 'January'
+      WHEN 2 THEN 'February'
+      WHEN 3 THEN 'March'
+      WHEN 4 THEN 'April'
+      WHEN 5 THEN 'May'
+      WHEN 6 THEN 'June'
+      WHEN 7 THEN 'July'
+      WHEN 8 THEN 'August'
+      WHEN 9 THEN 'September'
+      WHEN 10 THEN 'October'
+      WHEN 11 THEN 'November'
+      WHEN 12 THEN 'December'
+      END AS Month,
+      SUM(RoundedRevenue) AS Total
+      FROM SalesRollup
+      GROUP BY Month
+    )
+    SELECT Month,Round(Total) AS Total, RANK() OVER (ORDER BY Total DESC) AS TotalRank
+    FROM MonthlySales
+    """
+    return sql_statement
+
+
+### Order Date Parts
+# ex8-ex10 cut OrderDate apart on every fact row with SUBSTR/CAST for the
+# year and month (three times over for the quarter CASE). OrderDetailDate
+# stores those parts once per order line, keyed by OrderID so the variants
+# below join it with a rowid lookup. ex11 has no variant here: joining
+# OrderDetailDate into its window cost about as much as the JULIANDAY calls
+# it saved (max_days_without_order is the fast path for ex11). It is a separate
+# table because OrderDetail's columns are fixed by step11.csv; like
+# SalesRollup it is rebuilt with OrderDetail and a trigger keeps it in step
+# with later inserts.
+
+create_order_detail_date_sql = """
+CREATE TABLE OrderDetailDate(
+  OrderID INTEGER PRIMARY KEY,
+  OrderYear INTEGER NOT NULL,
+  OrderMonth INTEGER,
+  OrderQuarter INTEGER NOT NULL,
+  FOREIGN KEY(OrderID) REFERENCES OrderDetail(OrderID)
+);
+"""
+
+# Like ex8/ex9's CASE, OrderQuarter puts a month outside 1-12 in quarter 4.
+# OrderMonth follows ex10, which only names a month when SUBSTR(OrderDate,6,2)
+# is '01'-'12', and is NULL otherwise (short-year dates, see
+# convert_order_date).
+populate_order_detail_date_sql = """
+INSERT INTO OrderDetailDate(OrderID,OrderYear,OrderMonth,OrderQuarter)
+SELECT
+  OrderID,
+  CAST(SUBSTR(OrderDate,1,4) AS INTEGER),
+  CASE WHEN SUBSTR(OrderDate,6,2) GLOB '[01][0-9]' AND SUBSTR(OrderDate,6,2) BETWEEN '01' AND '12'
+  THEN CAST(SUBSTR(OrderDate,6,2) AS INTEGER) END,
+  CASE WHEN CAST(SUBSTR(OrderDate,6,2) AS INTEGER) BETWEEN 1 AND 12
+  THEN (CAST(SUBSTR(OrderDate,6,2) AS INTEGER)+2)/3 ELSE 4 END
+FROM OrderDetail
+"""
+
+create_order_detail_date_trigger_sql = """
+CREATE TRIGGER OrderDetailDate_OrderDetail_Insert AFTER INSERT ON OrderDetail
+BEGIN
+  INSERT INTO OrderDetailDate(OrderID,OrderYear,OrderMonth,OrderQuarter)
+  VALUES(
+    NEW.OrderID,
+    CAST(SUBSTR(NEW.OrderDate,1,4) AS INTEGER),
+    CASE WHEN SUBSTR(NEW.OrderDate,6,2) GLOB '[01][0-9]' AND SUBSTR(NEW.OrderDate,6,2) BETWEEN '01' AND '12'
+    THEN CAST(SUBSTR(NEW.OrderDate,6,2) AS INTEGER) END,
+    CASE WHEN CAST(SUBSTR(NEW.OrderDate,6,2) AS INTEGER) BETWEEN 1 AND 12
+    THEN (CAST(SUBSTR(NEW.OrderDate,6,2) AS INTEGER)+2)/3 ELSE 4 END
+  );
+END;
+"""
+
+
+@profiled
+def build_order_date_parts(conn):
+    # (Re)materializes OrderDetailDate from OrderDetail
+    with conn:
+        conn.execute("DROP TRIGGER IF EXISTS OrderDetailDate_OrderDetail_Insert")
+        conn.execute("DROP TABLE IF EXISTS OrderDetailDate")
+        conn.execute(create_order_detail_date_sql)
+        conn.execute(populate_order_detail_date_sql)
+        conn.execute(create_order_detail_date_trigger_sql)
+
+
+def ex8_dateparts(conn):
+    # ex8 with the quarter and year read from OrderDetailDate. NOT INDEXED
+    # keeps the planner from walking OrderDetail through its CustomerID
+    # index, whose scattered row reads cost more than the SUBSTRs saved.
+    sql_statement = """
+    WITH CustomerSales AS(
+      SELECT 'Q' || OrderDetailDate.OrderQuarter AS Quarter,
+      OrderDetailDate.OrderYear AS Year,
+      OrderDetail.CustomerID,
+      ROUND(SUM(Product.ProductUnitPrice*OrderDetail.QuantityOrdered)) AS Total
+      FROM OrderDetail NOT INDEXED
+      JOIN OrderDetailDate ON OrderDetail.OrderID=OrderDetailDate.OrderID
+      JOIN Product ON OrderDetail.ProductID=Product.ProductID
+      GROUP BY Quarter,Year,OrderDetail.CustomerID
+    )
+    SELECT Quarter,Year,CustomerID,Total
+    FROM CustomerSales
+    ORDER BY Year
+    """
+    return sql_statement
+
+def ex9_dateparts(conn):
+    # ex9 with the quarter and year read from OrderDetailDate (see ex8_dateparts)
+    sql_statement = """
+    WITH CustomerSales AS(
+      SELECT 'Q' || OrderDetailDate.OrderQuarter AS Quarter,
+      OrderDetailDate.OrderYear AS Year,
+      OrderDetail.CustomerID,
+      ROUND(SUM(Product.ProductUnitPrice*OrderDetail.QuantityOrdered)) AS Total
+      FROM OrderDetail NOT INDEXED
+      JOIN OrderDetailDate ON OrderDetail.OrderID=OrderDetailDate.OrderID
+      JOIN Product ON OrderDetail.ProductID=Product.ProductID
+      GROUP BY Quarter,Year,OrderDetail.CustomerID),
+      RankedSales AS(
+        SELECT Quarter,Year,CustomerID,Total,
+        RANK() OVER (PARTITION BY Quarter,Year ORDER BY Total DESC) AS CustomerRank
+        FROM CustomerSales
+      )
+      SELECT Quarter,Year,CustomerID,Total,CustomerRank
+      FROM RankedSales
+      WHERE CustomerRank<=5
+      ORDER BY Year
+    """
+    return sql_statement
+
+def ex10_dateparts(conn):
+    # ex10 with the month read from OrderDetailDate
+    sql_statement = """
+    WITH MonthlySales AS(
+      SELECT
+      CASE OrderDetailDate.OrderMonth
+      WHEN 1 THEN 'January'
+      WHEN 2 THEN 'February'
+      WHEN 3 THEN 'March'
+      WHEN 4 THEN 'April'
+      WHEN 5 THEN 'May'
+      WHEN 6 THEN 'June'
+      WHEN 7 THEN 'July'
+      WHEN 8 THEN 'August'
+      WHEN 9 THEN 'September'
+      WHEN 10 THEN 'October'
+      WHEN 11 THEN 'November'
+      WHEN 12 THEN 'December'
+      END AS Month,
+      SUM(ROUND(Product.ProductUnitPrice*OrderDetail.QuantityOrdered)) AS Total
+      FROM Product
+      JOIN OrderDetail ON OrderDetail.ProductID=Product.ProductID
+      JOIN OrderDetailDate ON OrderDetail.OrderID=OrderDetailDate.OrderID
+      GROUP BY Month
+    )
+    SELECT Month,Round(Total) AS Total, RANK() OVER (ORDER BY Total DESC) AS TotalRank
+    FROM MonthlySales
+    """
+    return sql_statement
+
+
+### Gap Analysis
+# ex11 finds each customer's longest gap between orders with two LAG windows,
+# a MaxDays aggregate joined back, and a correlated MIN(OrderDate) subquery
+# per candidate row. max_days_without_order gets the same rows from one pass
+# over OrderDetail sorted by (CustomerID, OrderDate), keeping only the
+# customer's best gap so far.
+
+EX11_COLUMNS = ["CustomerID", "FirstName", "LastName", "Country", "OrderDate",
+                "PreviousOrderDate", "MaxDaysWithoutOrder"]
+
+
+def max_days_without_order(conn):
+    # Inputs: Connection
+    # Output: List of rows identical to conn.execute(ex11(conn)).fetchall()
+    # A longer gap replaces the best one; an equal gap only counts again when
+    # it ends on the same date (order lines sharing that date), since ex11
+    # keeps the earliest OrderDate among the longest gaps. A short-year date
+    # (see convert_order_date) makes the gaps on either side of it NULL in
+    # ex11, so they are never the longest.
+    customers = {row[0]: row[1:] for row in conn.execute("""
+    SELECT Customer.CustomerID,Customer.FirstName,Customer.LastName,Country.CountryName
+    FROM Customer JOIN Country ON Customer.CountryID=Country.CountryID
+    """)}
+    day_numbers = {}
+    results = []
+
+    def emit(customer_id, best):
+        if best is not None:
+            days, orderdate, previous, count = best
+            results.extend([(customer_id, *customers[customer_id], orderdate, previous, float(days))] * count)
+
+    current = previous = previous_day = best = None
+    for customer_id, orderdate in conn.execute(
+            "SELECT CustomerID,OrderDate FROM OrderDetail ORDER BY CustomerID,OrderDate"):
+        if orderdate in day_numbers:
+            day = day_numbers[orderdate]
+        else:
+            try:
+                day = datetime.date.fromisoformat(orderdate).toordinal()
+            except ValueError:
+                day = None
+            day_numbers[orderdate] = day
+        if customer_id != current:
+            emit(current, best)
+            current, best = customer_id, None
+        elif day is not None and previous_day is not None:
+            days = day - previous_day
+            if best is None or days > best[0]:
+                best = [days, orderdate, previous, 1]
+            elif days == best[0] and orderdate == best[1]:
+                best[3] += 1
+        previous, previous_day = orderdate, day
+    emit(current, best)
+
+    results.sort(key=lambda row: (-row[6], -row[0]))
+    return results
+
+
+### Prepared Queries
+# Every exN as (sql_statement, parameters). The SQL text never embeds a value,
+# so sqlite3's per-connection statement cache (cached_statements) prepares
+# each query once per connection and reuses it for every later call.
+
+PARAMETERIZED_QUERIES = {
+    "ex1": ex1_query,
+    "ex2": ex2_query,
+}
+STATIC_QUERIES = {
+    "ex3": ex3, "ex4": ex4, "ex5": ex5, "ex6": ex6, "ex7": ex7,
+    "ex8": ex8, "ex9": ex9, "ex10": ex10, "ex11": ex11,
+}
+# Rollup statements whose results are identical to exN's
+ROLLUP_QUERIES = {
+    "ex3": ex3_rollup, "ex4": ex4_rollup, "ex10": ex10_rollup,
+}
+# All rollup statements. ex5-ex9 total exact cents, so a total of exactly X.50
+# may come out one higher than from exN (see "### Sales Rollups")
+ROLLUP_CENTS_QUERIES = {
+    **ROLLUP_QUERIES,
+    "ex5": ex5_rollup, "ex6": ex6_rollup, "ex7": ex7_rollup, "ex8": ex8_rollup, "ex9": ex9_rollup,
+}
+DATEPART_QUERIES = {
+    "ex8": ex8_dateparts, "ex9": ex9_dateparts, "ex10": ex10_dateparts,
+}
+# Alternative statements over derived tables; queries a variant does not
+# cover, or whose table was not built, fall back to STATIC_QUERIES
+QUERY_VARIANTS = {
+    "rollup": ROLLUP_QUERIES,
+    "rollup_cents": ROLLUP_CENTS_QUERIES,
+    "dateparts": DATEPART_QUERIES,
+}
+VARIANT_TABLES = {
+    "rollup": "SalesRollup",
+    "rollup_cents": "SalesRollup",
+    "dateparts": "OrderDetailDate",
+}
+
+
+def prepare_query(conn, name, *args, variant=None):
+    # Inputs: Connection, query name ("ex1" ... "ex11"), the exN arguments and
+    #         optionally a QUERY_VARIANTS name ("rollup", "rollup_cents",
+    #         "dateparts")
+    # Output: (sql_statement, parameters)
+    if name in PARAMETERIZED_QUERIES:
+        return PARAMETERIZED_QUERIES[name](conn, *args)
+    if variant is not None and name in QUERY_VARIANTS[variant] and conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (VARIANT_TABLES[variant],)).fetchone():
+        return QUERY_VARIANTS[variant][name](conn, *args), ()
+    return STATIC_QUERIES[name](conn, *args), ()
+
+
+def run_prepared_query(conn, name, *args, variant=None):
+    # Executes a predefined query on conn through the cached-statement path
+    sql_statement, params = prepare_query(conn, name, *args, variant=variant)
+    return conn.execute(sql_statement, params).fetchall()
+
+
+def explain_queries(conn, CustomerName=None, verbose=False):
+    # Inputs: Connection and a customer for ex1/ex2 (default: the first one)
+    # Output: Dictionary of query name -> EXPLAIN QUERY PLAN detail lines;
+    #         those of ex1/ex2 start with the plan of resolve_customer_id
+    if CustomerName is None:
+        CustomerName = conn.execute(
+            "SELECT FirstName || ' ' || LastName FROM Customer ORDER BY CustomerID LIMIT 1").fetchone()[0]
+    plans = {}
+    for name in list(PARAMETERIZED_QUERIES) + list(STATIC_QUERIES):
+        args = (CustomerName,) if name in PARAMETERIZED_QUERIES else ()
+        sql_statement, params = prepare_query(conn, name, *args)
+        plans[name] = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql_statement, params)]
+        if args:
+            resolve_plan = conn.execute("EXPLAIN QUERY PLAN " + resolve_customer_id_sql, CustomerName.split(" ", 1))
+            plans[name] = [row[3] for row in resolve_plan] + plans[name]
+        if verbose:
+            print(name)
+            for detail in plans[name]:
+                print(f"  {detail}")
+    return plans
+
+
+### In-memory Backend
+# The normalized tables fit in memory, so ex3-ex11 can also be answered from
+# NumPy-backed frames loaded once per database. The frame functions return
+# the rows pd.read_sql_query gives for the SQL, which means following
+# SQLite's arithmetic: SUMs add order lines in OrderID order the way this
+# SQLite does (plainly before 3.43, with Kahan-Babuska-Neumaier compensation
+# from 3.43 on), ROUND rounds halves away from zero, and dates are the
+# OrderDate text sliced as the SQL does. Rows the SQL's ORDER BY leaves tied
+# come in whatever order SQLite's plan produces, so the frames break those
+# ties with explicit keys, listed at each function.
+
+QUARTER_NAMES = np.array(["Q1", "Q2", "Q3", "Q4"], dtype=object)
+MONTH_NAMES = np.array(["January", "February", "March", "April", "May", "June", "July",
+                        "August", "September", "October", "November", "December"], dtype=object)
+SQLITE_COMPENSATED_SUM = sqlite3.sqlite_version_info >= (3, 43, 0)
+
+
+def sqlite_round(values, digits=0):
+    # SQLite ROUND(x) is floor(x+0.5) on |x|; with digits it rounds the
+    # decimal text, which for sums of whole cents equals rint(x*10^d)/10^d
+    values = np.asarray(values, dtype=np.float64)
+    if digits:
+        scale = 10.0 ** digits
+        return np.rint(values * scale) / scale
+    return np.where(values >= 0, np.floor(values + 0.5), -np.floor(-values + 0.5))
+
+
+def sqlite_integer(texts):
+    # CAST(text AS INTEGER): the leading integer of each text, 0 without one
+    # ('12-0' is 12, '-0' is 0)
+    prefix = pd.Series(texts, dtype=object).str.extract(r"^\s*([+-]?\d+)", expand=False)
+    return prefix.fillna("0").astype(np.int64).to_numpy()
+
+
+def ordered_group_sum(codes, values, size, compensated=SQLITE_COMPENSATED_SUM):
+    # Per-group sums added in row order, like SQLite's SUM. compensated
+    # follows the Kahan-Babuska-Neumaier step SQLite 3.43+ uses for REALs.
+    codes = np.asarray(codes)
+    values = np.asarray(values, dtype=np.float64)
+    totals = np.zeros(size, dtype=np.float64)
+    if not compensated:
+        np.add.at(totals, codes, values)
+        return totals
+    # Each group's values go into one row of a zero-padded matrix (padding
+    # adds nothing to the sum or the error), so cumsum along the rows gives
+    # the running sums one step at a time. Groups whose lengths round up to
+    # the same step of a 2^(1/4) geometric series share a matrix, so long
+    # groups are padded by under a fifth and there are few matrices.
+    counts = np.bincount(codes, minlength=size)
+    order = np.argsort(codes, kind="stable")
+    position = np.empty(len(codes), dtype=np.int64)
+    position[order] = np.arange(len(codes)) - (np.cumsum(counts) - counts)[codes[order]]
+    steps = np.ceil(4 * np.log2(np.maximum(counts, 1)))
+    width = np.where(counts > 0, np.maximum(np.ceil(2 ** (steps / 4)).astype(np.int64), counts), 0)
+    groups = np.flatnonzero(counts)
+    groups = groups[np.argsort(width[groups], kind="stable")]
+    slot = np.zeros(size, dtype=np.int64)
+    slot[groups] = np.cumsum(width[groups]) - width[groups]
+    padded = np.zeros(width.sum())
+    padded[slot[codes] + position] = values
+    first = 0
+    for w, k in zip(*np.unique(width[groups], return_counts=True)):
+        matrix = padded[slot[groups[first]]:slot[groups[first]] + k * w].reshape(k, w)
+        running = np.cumsum(matrix, axis=1)
+        previous = np.zeros_like(running)
+        previous[:, 1:] = running[:, :-1]
+        # SQLite adds (larger - sum) + smaller of the running sum and the value
+        larger = np.abs(previous) > np.abs(matrix)
+        error = np.where(larger, previous, matrix)
+        error -= running
+        error += np.where(larger, matrix, previous)
+        totals[groups[first:first + k]] = running[:, -1] + np.cumsum(error, axis=1)[:, -1]
+        first += k
+    return totals
+
+
+def stable_order(*keys):
+    # Row order of a stable sort on keys (the first key is the primary one)
+    return np.lexsort(keys[::-1])
+
+
+class SalesFrames:
+    # Inputs: Connection to a normalized database
+    # Loads every table once: int32 keys, categorical names and, per order
+    # line, the OrderDate text with the year, month and day number the SQL
+    # reads from it. OrderDetail is kept in OrderID order.
+    def __init__(self, conn):
+        orders = pd.read_sql_query(
+            "SELECT CustomerID,ProductID,OrderDate,QuantityOrdered FROM OrderDetail ORDER BY OrderID", conn)
+        products = pd.read_sql_query("SELECT ProductID,ProductUnitPrice FROM Product", conn)
+        customers = pd.read_sql_query("SELECT CustomerID,FirstName,LastName,CountryID FROM Customer", conn)
+        countries = pd.read_sql_query("SELECT CountryID,CountryName,RegionID FROM Country", conn)
+        regions = pd.read_sql_query("SELECT RegionID,Region FROM Region", conn)
+
+        self.customer_id = orders["CustomerID"].to_numpy(np.int32)
+        self.quantity = orders["QuantityOrdered"].to_numpy(np.int32)
+
+        # Dates are worked out once per distinct OrderDate. date_code follows
+        # the text order ORDER BY OrderDate uses, and the parts below slice the
+        # text like the SQL does (short-year dates, see convert_order_date).
+        date_code, dates = pd.factorize(orders["OrderDate"], sort=True)
+        dates = np.asarray(dates, dtype=object)
+        self.date_code = date_code.astype(np.int32)
+        self.dates = dates
+        # CAST(SUBSTR(OrderDate,1,4)) and CAST(SUBSTR(OrderDate,6,2)) (ex8/ex9)
+        self.order_year = sqlite_integer([d[:4] for d in dates])[date_code]
+        self.order_month = sqlite_integer([d[5:7] for d in dates])[date_code]
+        # ex10's CASE SUBSTR(OrderDate,6,2) WHEN '01' ... WHEN '12', 0 for no month
+        month_text = pd.Series([d[5:7] for d in dates], dtype=object)
+        self.month_number = month_text.map({f"{m:02d}": m for m in range(1, 13)}).fillna(0).to_numpy(np.int64)[date_code]
+        # Day numbers for JULIANDAY differences (ex11), NaN where it is NULL
+        day_number = np.full(len(dates), np.nan)
+        for i, d in enumerate(dates):
+            try:
+                day_number[i] = datetime.date.fromisoformat(d).toordinal()
+            except ValueError:
+                pass
+        self.day_number = day_number[date_code]
+
+        # ID-indexed lookup arrays (IDs are AUTOINCREMENT, so dense from 1)
+        price = np.zeros(products["ProductID"].max() + 1, dtype=np.float64)
+        price[products["ProductID"].to_numpy()] = products["ProductUnitPrice"].to_numpy(np.float64)
+        self.line_price = price[orders["ProductID"].to_numpy(np.int32)]
+        self.revenue = self.line_price * self.quantity
+
+        size = customers["CustomerID"].max() + 1
+        self.customer_name = np.empty(size, dtype=object)
+        self.customer_name[customers["CustomerID"].to_numpy()] = (
+            customers["FirstName"] + " " + customers["LastName"]).to_numpy(object)
+        self.first_name = pd.Categorical(customers["FirstName"])
+        self.last_name = pd.Categorical(customers["LastName"])
+        self.customer_row = np.full(size, -1, dtype=np.int32)
+        self.customer_row[customers["CustomerID"].to_numpy()] = np.arange(len(customers), dtype=np.int32)
+        self.customer_country = np.zeros(size, dtype=np.int32)
+        self.customer_country[customers["CustomerID"].to_numpy()] = customers["CountryID"].to_numpy(np.int32)
+
+        self.country_name = pd.Categorical(countries["CountryName"])
+        self.country_row = np.full(countries["CountryID"].max() + 1, -1, dtype=np.int32)
+        self.country_row[countries["CountryID"].to_numpy()] = np.arange(len(countries), dtype=np.int32)
+        self.region_name = pd.Categorical(regions["Region"])
+        region_row = np.full(regions["RegionID"].max() + 1, -1, dtype=np.int32)
+        region_row[regions["RegionID"].to_numpy()] = np.arange(len(regions), dtype=np.int32)
+        self.country_region_row = region_row[countries["RegionID"].to_numpy(np.int32)]
+
+        # Per order line country and region rows (into the frames above)
+        self.line_country = self.country_row[self.customer_country[self.customer_id]]
+        self.line_region = self.country_region_row[self.line_country]
+
+
+def frame_ex3(frames):
+    # ex3: Total DESC, ties by CustomerID descending
+    totals = ordered_group_sum(frames.customer_id, frames.revenue, len(frames.customer_name))
+    ids = np.unique(frames.customer_id)
+    total = sqlite_round(totals[ids], 2)
+    order = stable_order(-total, -ids)
+    return pd.DataFrame({"Name": frames.customer_name[ids][order], "Total": total[order]})
+
+
+def _frame_named_totals(frames, line_rows, names, column, digits):
+    # ex4/ex5: totals per region/country (names are unique per row), Total
+    # DESC, ties by name descending (category codes follow the text order)
+    totals = ordered_group_sum(line_rows, frames.revenue, len(names))
+    rows = np.flatnonzero(np.bincount(line_rows, minlength=len(names)))
+    total = sqlite_round(totals[rows], digits)
+    order = stable_order(-total, -names.codes[rows])
+    return pd.DataFrame({column: np.asarray(names.take(rows[order]), dtype=object), "Total": total[order]})
+
+
+def frame_ex4(frames):
+    return _frame_named_totals(frames, frames.line_region, frames.region_name, "Region", 2)
+
+
+def frame_ex5(frames):
+    return _frame_named_totals(frames, frames.line_country, frames.country_name, "Country", 0)
+
+
+def _frame_country_ranks(frames):
+    # ex6/ex7: country totals ranked within their region, Region ascending,
+    # then rank, ties by Country descending
+    totals = ordered_group_sum(frames.line_country, frames.revenue, len(frames.country_name))
+    rows = np.flatnonzero(np.bincount(frames.line_country, minlength=len(frames.country_name)))
+    region_code = frames.region_name.codes[frames.country_region_row[rows]]
+    window = stable_order(region_code, -totals[rows], -frames.country_name.codes[rows])
+    rows, region_code = rows[window], region_code[window]
+    rank = pd.Series(totals[rows]).groupby(region_code).rank(method="min", ascending=False)
+    region = np.asarray(frames.region_name.take(frames.country_region_row[rows]), dtype=object)
+    country = np.asarray(frames.country_name.take(rows), dtype=object)
+    return region, country, totals[rows], rank.to_numpy(np.int64)
+
+
+def frame_ex6(frames):
+    region, country, totals, rank = _frame_country_ranks(frames)
+    return pd.DataFrame({"Region": region, "Country": country,
+                         "CountryTotal": sqlite_round(totals), "TotalRank": rank})
+
+
+def frame_ex7(frames):
+    region, country, totals, rank = _frame_country_ranks(frames)
+    top = rank == 1
+    return pd.DataFrame({"Region": region[top], "Country": country[top],
+                         "CountryTotal": sqlite_round(totals[top]), "CountryRegionalRank": rank[top]})
+
+
+def _frame_quarter_sales(frames):
+    # ex8/ex9: (Quarter, Year, CustomerID) totals; a month outside 1-12
+    # falls in Q4 like the SQL's ELSE
+    month = frames.order_month
+    quarter = np.where((month >= 1) & (month <= 12), (month - 1) // 3, 3)
+    # Four characters cast to an integer lie in -999..9999, so each key packs
+    # into one int64
+    customers = len(frames.customer_name) + 1
+    keys = (quarter * 20000 + frames.order_year + 10000) * customers + frames.customer_id
+    codes, groups = pd.factorize(keys)
+    totals = sqlite_round(ordered_group_sum(codes, frames.revenue, len(groups)))
+    period, customer_id = np.divmod(np.asarray(groups), customers)
+    quarter, year = np.divmod(period, 20000)
+    return quarter, year - 10000, customer_id, totals
+
+
+def frame_ex8(frames):
+    # ex8: Year, ties by Quarter, then CustomerID
+    quarter, year, customer_id, totals = _frame_quarter_sales(frames)
+    order = stable_order(year, quarter, customer_id)
+    return pd.DataFrame({"Quarter": QUARTER_NAMES[quarter[order]], "Year": year[order],
+                         "CustomerID": customer_id[order], "Total": totals[order]})
+
+
+def frame_ex9(frames):
+    # ex9: Year, ties by Quarter, then Total DESC, then CustomerID
+    quarter, year, customer_id, totals = _frame_quarter_sales(frames)
+    order = stable_order(year, quarter, -totals, customer_id)
+    quarter, year, customer_id, totals = quarter[order], year[order], customer_id[order], totals[order]
+    partition = quarter * 20000 + year
+    rank = pd.Series(totals).groupby(partition).rank(method="min", ascending=False).to_numpy(np.int64)
+    top = rank <= 5
+    return pd.DataFrame({"Quarter": QUARTER_NAMES[quarter[top]], "Year": year[top],
+                         "CustomerID": customer_id[top], "Total": totals[top],
+                         "CustomerRank": rank[top]})
+
+
+def frame_ex10(frames):
+    # ex10: RANK's Total DESC gives the row order, ties by Month (the NULL
+    # month of dates with no month text first, then names in text order)
+    names = np.r_[np.array([None], dtype=object), MONTH_NAMES]
+    totals = ordered_group_sum(frames.month_number, sqlite_round(frames.revenue), len(names))
+    present = np.flatnonzero(np.bincount(frames.month_number, minlength=len(names)))
+    name_order = np.r_[-1, np.argsort(np.argsort(MONTH_NAMES, kind="stable"))]
+    order = present[stable_order(-totals[present], name_order[present])]
+    rank = pd.Series(totals[order]).rank(method="min", ascending=False).to_numpy(np.int64)
+    return pd.DataFrame({"Month": names[order],
+                         "Total": sqlite_round(totals[order]), "TotalRank": rank})
+
+
+def frame_ex11(frames):
+    # ex11: gaps between consecutive order dates (in text order) per customer
+    # via shift; a date JULIANDAY cannot read leaves its gaps NaN, which the
+    # max skips like SQL's NULL
+    order = stable_order(frames.customer_id, frames.date_code)
+    customer_id = frames.customer_id[order]
+    date_code = frames.date_code[order]
+    day_number = frames.day_number[order]
+    same_customer = np.r_[False, customer_id[1:] == customer_id[:-1]]
+    previous = np.r_[date_code[:1], date_code[:-1]]
+    days = day_number - np.r_[day_number[:1], day_number[:-1]]
+    gaps = pd.DataFrame({"CustomerID": customer_id[same_customer], "OrderDate": date_code[same_customer],
+                         "PreviousOrderDate": previous[same_customer], "Days": days[same_customer]})
+    longest = gaps["Days"] == gaps.groupby("CustomerID")["Days"].transform("max")
+    gaps = gaps[longest]
+    gaps = gaps[gaps["OrderDate"] == gaps.groupby("CustomerID")["OrderDate"].transform("min")]
+    gaps = gaps.iloc[stable_order(-gaps["Days"].to_numpy(), -gaps["CustomerID"].to_numpy(np.int64))]
+    ids = gaps["CustomerID"].to_numpy(np.int64)
+    rows = frames.customer_row[ids]
+    country = frames.country_row[frames.customer_country[ids]]
+    return pd.DataFrame({
+        "CustomerID": ids,
+        "FirstName": np.asarray(frames.first_name.take(rows), dtype=object),
+        "LastName": np.asarray(frames.last_name.take(rows), dtype=object),
+        "Country": np.asarray(frames.country_name.take(country), dtype=object),
+        "OrderDate": frames.dates[gaps["OrderDate"].to_numpy()],
+        "PreviousOrderDate": frames.dates[gaps["PreviousOrderDate"].to_numpy()],
+        "MaxDaysWithoutOrder": gaps["Days"].to_numpy(np.float64),
+    })
+
+
+FRAME_QUERIES = {
+    "ex3": frame_ex3, "ex4": frame_ex4, "ex5": frame_ex5, "ex6": frame_ex6, "ex7": frame_ex7,
+    "ex8": frame_ex8, "ex9": frame_ex9, "ex10": frame_ex10, "ex11": frame_ex11,
+}
+
+
+def run_query_frame(conn, name, *args, backend="sqlite", frames=None, variant=None):
+    # Inputs: Connection, query name and exN arguments; backend "sqlite" runs
+    #         the (variant) SQL, "pandas" answers ex3-ex11 from frames (a
+    #         SalesFrames, loaded from conn when not given)
+    # Output: DataFrame
+    if backend == "pandas" and name in FRAME_QUERIES:
+        return FRAME_QUERIES[name](frames if frames is not None else SalesFrames(conn))
+    sql_statement, params = prepare_query(conn, name, *args, variant=variant)
+    return pd.read_sql_query(sql_statement, conn, params=params)
@@ -0,0 +1,17 @@
+# data.csv lines with short-year order dates (see convert_order_date), for
+# the tests of everything that reads OrderDate
+
+EARLY_DATES = ["00120101", "09991231", "01500707", "00051109"]
+
+
+def with_early_dates(lines, every=4):
+    # Copy of data.csv lines in which the first order date of every every-th
+    # data line is replaced, cycling through EARLY_DATES
+    lines = list(lines)
+    for n, i in enumerate(range(1, len(lines), every)):
+        parts = lines[i].rstrip("\n").split("\t")
+        dates = parts[10].split(";")
+        dates[0] = EARLY_DATES[n % len(EARLY_DATES)]
+        parts[10] = ";".join(dates)
+        lines[i] = "\t".join(parts) + "\n"
+    return lines
@@ -0,0 +1,69 @@
+import unittest
+import sys
+from pathlib import Path
+
+import pandas as pd
+import sqlite3
+sys.path.insert(1, str(Path(__file__).parents[1]))
+
+
+from mini_project2 import build_normalized_database, NORMALIZED_TABLES
+
+
+class TestMethods(unittest.TestCase):
+
+    def test_1(self):
+        data_filename = 'data.csv'
+        normalized_database_filename = 'normalized.db'
+        timings = build_normalized_database(data_filename, normalized_database_filename)
+        for stage in ["parse", "total"] + NORMALIZED_TABLES:
+            assert stage in timings
+
+        conn = sqlite3.connect(normalized_database_filename)
+        expected = {
+            "step1.csv": """SELECT * FROM Region""",
+            "step5.csv": """SELECT * FROM Customer""",
+            "step7.csv": """SELECT * FROM ProductCategory""",
+            "step9.csv": """SELECT * FROM Product""",
+            "step11.csv": """SELECT * FROM OrderDetail LIMIT 1000""",
+        }
+        for fixture, sql in expected.items():
+            data = pd.read_csv(fixture)
+            df = pd.read_sql_query(sql, conn)
+            assert df.equals(data) == True
+        conn.close()
+
+    def test_2(self):
+        data_filename = 'data.csv'
+        normalized_database_filename = 'normalized.db'
+        timings = build_normalized_database(data_filename, normalized_database_filename, bulk=True)
+        assert "finish_bulk_load" in timings
+
+        conn = sqlite3.connect(normalized_database_filename)
+        data = pd.read_csv("step11.csv")
+        df = pd.read_sql_query("""SELECT * FROM OrderDetail LIMIT 1000""", conn)
+        assert df.equals(data) == True
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        assert journal_mode == "delete"
+        conn.close()
+
+    def test_3(self):
+        data_filename = 'data.csv'
+        normalized_database_filename = 'normalized.db'
+        build_normalized_database(data_filename, normalized_database_filename, workers=4)
+
+        conn = sqlite3.connect(normalized_database_filename)
+        expected = {
+            "step5.csv": """SELECT * FROM Customer""",
+            "step9.csv": """SELECT * FROM Product""",
+            "step11.csv": """SELECT * FROM OrderDetail LIMIT 1000""",
+        }
+        for fixture, sql in expected.items():
+            data = pd.read_csv(fixture)
+            df = pd.read_sql_query(sql, conn)
+            assert df.equals(data) == True
+        conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
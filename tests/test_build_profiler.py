@@ -0,0 +1,60 @@
+import unittest
+import sys
+import os
+import json
+import sqlite3
+import tempfile
+from pathlib import Path
+
+sys.path.insert(1, str(Path(__file__).parents[1]))
+
+
+import mini_project2
+from mini_project2 import BuildProfiler
+
+
+class TestMethods(unittest.TestCase):
+
+    def test_1(self):
+        data_filename = 'data.csv'
+        normalized_database_filename = 'normalized.db'
+        steps = [
+            mini_project2.step1_create_region_table,
+            mini_project2.step3_create_country_table,
+            mini_project2.step5_create_customer_table,
+            mini_project2.step7_create_productcategory_table,
+            mini_project2.step9_create_product_table,
+            mini_project2.step11_create_orderdetail_table,
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            report_filename = os.path.join(tmp, 'build_profile.json')
+            with BuildProfiler(report_filename):
+                for step in steps:
+                    step(data_filename, normalized_database_filename)
+
+            with open(report_filename) as f:
+                report = json.load(f)
+        for step in steps:
+            assert report["functions"][step.__name__]["calls"] == 1
+        assert report["functions"]["build_normalized_database"]["calls"] == len(steps)
+        assert [span["name"] for span in report["spans"]["children"]] == [step.__name__ for step in steps]
+
+        conn = sqlite3.connect(normalized_database_filename)
+        for table in mini_project2.NORMALIZED_TABLES:
+            count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            assert report["counts"][f"{table}.rows_out"] == count
+        conn.close()
+        assert mini_project2._build_profiler is None
+
+    def test_2(self):
+        # Outside a profiler the decorated functions behave as before
+        conn = mini_project2.create_connection(':memory:')
+        mini_project2.create_table(conn, "CREATE TABLE T(x INTEGER)")
+        conn.execute("INSERT INTO T VALUES (1)")
+        assert mini_project2.execute_sql_statement("SELECT x FROM T", conn) == [(1,)]
+        assert mini_project2.create_connection.__name__ == 'create_connection'
+        conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+import sys
+from pathlib import Path
+
+sys.path.insert(1, str(Path(__file__).parents[1]))
+
+
+from mini_project2 import ColumnParser
+
+
+class TestMethods(unittest.TestCase):
+
+    def test_1(self):
+        line = b" Ana Lee\t1 Main St\tBerlin\tGermany\tWestern Europe\tTofu;Chai\tProduce;Beverages\r\n"
+        parts = ColumnParser([0, 4, 6], explode=[6]).parse(line)
+        assert parts[0] == "Ana Lee"
+        assert parts[4] == "Western Europe"
+        assert parts[6] == ["Produce", "Beverages"]
+        assert len(parts) == 7
+
+    def test_2(self):
+        line = b"Ana Lee\t1 Main St\tBerlin\tGermany\tWestern Europe\tTofu;Chai\tProduce;Beverages\n"
+        parts = ColumnParser([4]).parse(line)
+        assert parts[4] == "Western Europe"
+        assert len(parts) == 6
+        parts = ColumnParser([9, 10], explode=[9, 10]).parse(line)
+        assert len(parts) < 10
+
+
+if __name__ == '__main__':
+    unittest.main()
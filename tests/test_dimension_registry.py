@@ -0,0 +1,37 @@
+import unittest
+import sys
+from pathlib import Path
+
+sys.path.insert(1, str(Path(__file__).parents[1]))
+
+
+import mini_project2
+from mini_project2 import DimensionRegistry
+
+
+class TestMethods(unittest.TestCase):
+
+    def test_1(self):
+        data_filename = 'data.csv'
+        normalized_database_filename = 'normalized.db'
+        registry = DimensionRegistry(normalized_database_filename)
+        mini_project2.step1_create_region_table(data_filename, normalized_database_filename, registry=registry)
+        mini_project2.step3_create_country_table(data_filename, normalized_database_filename, registry=registry)
+        mini_project2.step5_create_customer_table(data_filename, normalized_database_filename, registry=registry)
+        mini_project2.step7_create_productcategory_table(data_filename, normalized_database_filename, registry=registry)
+        mini_project2.step9_create_product_table(data_filename, normalized_database_filename, registry=registry)
+        mini_project2.step11_create_orderdetail_table(data_filename, normalized_database_filename, registry=registry)
+
+        lookups = [
+            mini_project2.step2_create_region_to_regionid_dictionary,
+            mini_project2.step4_create_country_to_countryid_dictionary,
+            mini_project2.step6_create_customer_to_customerid_dictionary,
+            mini_project2.step8_create_productcategory_to_productcategoryid_dictionary,
+            mini_project2.step10_create_product_to_productid_dictionary,
+        ]
+        for lookup in lookups:
+            assert lookup(normalized_database_filename, registry=registry) == lookup(normalized_database_filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
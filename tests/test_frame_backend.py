@@ -0,0 +1,94 @@
+import unittest
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+import pandas as pd
+import sqlite3
+sys.path.insert(1, str(Path(__file__).parents[1]))
+
+
+import mini_project2
+from early_dates import with_early_dates
+
+# The columns each exN orders by; rows tied on them may come in any order
+ORDER_COLUMNS = {
+    "ex3": ["Total"], "ex4": ["Total"], "ex5": ["Total"], "ex6": ["Region", "TotalRank"],
+    "ex7": ["Region"], "ex8": ["Year"], "ex9": ["Year"], "ex10": ["TotalRank"],
+    "ex11": ["MaxDaysWithoutOrder", "CustomerID"],
+}
+
+
+def same_rows(df, expected, name):
+    # Same ordering columns row by row, and the same rows once ties are sorted
+    columns = ORDER_COLUMNS[name]
+    if not df[columns].equals(expected[columns]):
+        return False
+    return (df.sort_values(list(df.columns), na_position="first").reset_index(drop=True)
+            .equals(expected.sort_values(list(expected.columns), na_position="first").reset_index(drop=True)))
+
+
+class TestMethods(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.conn = sqlite3.connect("normalized.db")
+        cls.frames = mini_project2.SalesFrames(cls.conn)
+
+    def test_1(self):
+        for name in ["ex%d" % i for i in range(3, 12)]:
+            data = pd.read_csv(name + ".csv")
+            df = mini_project2.run_query_frame(self.conn, name, backend="pandas", frames=self.frames)
+            assert same_rows(df, data, name), name
+
+    def test_2(self):
+        for name in ["ex%d" % i for i in range(3, 12)]:
+            expected = mini_project2.run_query_frame(self.conn, name)
+            assert same_rows(mini_project2.FRAME_QUERIES[name](self.frames), expected, name), name
+
+    def test_3(self):
+        assert mini_project2.sqlite_round(2.5) == 3.0
+        assert mini_project2.sqlite_round(-2.5) == -3.0
+        assert mini_project2.sqlite_round(1167.1200000000001, 2) == 1167.12
+        codes, values = np.array([0, 0, 0, 1]), np.array([1e16, 1.0, -1e16, 0.1])
+        assert list(mini_project2.ordered_group_sum(codes, values, 2, compensated=False)) == [0.0, 0.1]
+        assert list(mini_project2.ordered_group_sum(codes, values, 2, compensated=True)) == [1.0, 0.1]
+
+        # The vectorized compensated sum gives exactly SQLite's step-by-step one
+        rng = np.random.default_rng(1)
+        codes = rng.integers(0, 300, 20000)
+        codes[:3000] = 7
+        values = rng.normal(size=20000) * 10.0 ** rng.integers(-3, 16, 20000)
+        totals, errors = [0.0] * 301, [0.0] * 301
+        for code, value in zip(codes.tolist(), values.tolist()):
+            total = totals[code] + value
+            if abs(totals[code]) > abs(value):
+                errors[code] += (totals[code] - total) + value
+            else:
+                errors[code] += (value - total) + totals[code]
+            totals[code] = total
+        expected = np.array(totals) + np.array(errors)
+        assert np.array_equal(mini_project2.ordered_group_sum(codes, values, 301, compensated=True), expected)
+
+    def test_4(self):
+        # Short-year order dates, which the frames slice like the SQL does
+        with open('data.csv', 'r', encoding='utf-8') as f:
+            lines = with_early_dates(f.readlines())
+        with tempfile.TemporaryDirectory() as tmp:
+            data_filename = os.path.join(tmp, 'data.csv')
+            normalized_database_filename = os.path.join(tmp, 'normalized.db')
+            with open(data_filename, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+            mini_project2.build_normalized_database(data_filename, normalized_database_filename)
+            conn = sqlite3.connect(normalized_database_filename)
+            frames = mini_project2.SalesFrames(conn)
+            for name in ["ex%d" % i for i in range(3, 12)]:
+                expected = mini_project2.run_query_frame(conn, name)
+                assert same_rows(mini_project2.FRAME_QUERIES[name](frames), expected, name), name
+            conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
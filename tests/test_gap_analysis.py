@@ -0,0 +1,47 @@
+import unittest
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import sqlite3
+sys.path.insert(1, str(Path(__file__).parents[1]))
+
+
+import mini_project2
+from early_dates import with_early_dates
+
+class TestMethods(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.conn = sqlite3.connect("normalized.db")
+
+    def test_1(self):
+        data = pd.read_csv("ex11.csv")
+        df = pd.DataFrame(mini_project2.max_days_without_order(self.conn), columns=mini_project2.EX11_COLUMNS)
+        assert df.equals(data) == True
+
+    def test_2(self):
+        expected = self.conn.execute(mini_project2.ex11(self.conn)).fetchall()
+        assert mini_project2.max_days_without_order(self.conn) == expected
+
+    def test_3(self):
+        # Short-year order dates, whose neighbouring gaps are NULL in ex11
+        with open('data.csv', 'r', encoding='utf-8') as f:
+            lines = with_early_dates(f.readlines(), every=3)
+        with tempfile.TemporaryDirectory() as tmp:
+            data_filename = os.path.join(tmp, 'data.csv')
+            normalized_database_filename = os.path.join(tmp, 'normalized.db')
+            with open(data_filename, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+            mini_project2.build_normalized_database(data_filename, normalized_database_filename)
+            conn = sqlite3.connect(normalized_database_filename)
+            assert conn.execute("SELECT COUNT(*) FROM OrderDetail WHERE OrderDate LIKE '12-%'").fetchone()[0] > 0
+            expected = conn.execute(mini_project2.ex11(conn)).fetchall()
+            assert mini_project2.max_days_without_order(conn) == expected
+            conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
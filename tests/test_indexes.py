@@ -0,0 +1,30 @@
+import unittest
+import sys
+from pathlib import Path
+
+import sqlite3
+sys.path.insert(1, str(Path(__file__).parents[1]))
+
+
+import mini_project2
+
+class TestMethods(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.conn = sqlite3.connect("normalized.db")
+
+    def test_1(self):
+        indexes = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        for table_indexes in mini_project2.INDEX_PLAN.values():
+            for index_sql in table_indexes:
+                assert index_sql.split()[5] in indexes
+
+    def test_2(self):
+        plans = mini_project2.explain_queries(self.conn, 'Alejandra Camino')
+        assert sorted(plans) == sorted(["ex%d" % i for i in range(1, 12)])
+        for name in ["ex1", "ex2"]:
+            assert not any(detail.startswith("SCAN OrderDetail") for detail in plans[name])
+
+
+if __name__ == '__main__':
+    unittest.main()
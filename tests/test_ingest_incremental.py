@@ -0,0 +1,160 @@
+import unittest
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import sqlite3
+sys.path.insert(1, str(Path(__file__).parents[1]))
+
+
+from mini_project2 import STATIC_QUERIES, build_normalized_database, check_sales_rollups, ingest_incremental
+
+
+class TestMethods(unittest.TestCase):
+
+    def test_1(self):
+        with open('data.csv', 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        with tempfile.TemporaryDirectory() as tmp:
+            data_filename = os.path.join(tmp, 'data.csv')
+            normalized_database_filename = os.path.join(tmp, 'normalized.db')
+            with open(data_filename, 'w', encoding='utf-8') as f:
+                f.writelines(lines[:len(lines) // 2])
+
+            assert ingest_incremental(data_filename, normalized_database_filename)["mode"] == "full"
+            assert ingest_incremental(data_filename, normalized_database_filename)["mode"] == "unchanged"
+            with open(data_filename, 'a', encoding='utf-8') as f:
+                f.writelines(lines[len(lines) // 2:])
+            assert ingest_incremental(data_filename, normalized_database_filename)["mode"] == "incremental"
+
+            conn = sqlite3.connect(normalized_database_filename)
+            df = pd.read_sql_query("""SELECT count(*) COUNT FROM OrderDetail""", conn)
+            assert df['COUNT'][0] == 621806
+            assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+            assert check_sales_rollups(conn) == []
+            conn.close()
+
+    def test_2(self):
+        # A last line still being written is only ingested once it is complete
+        with open('data.csv', 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        half = len(lines) // 2
+        with tempfile.TemporaryDirectory() as tmp:
+            data_filename = os.path.join(tmp, 'data.csv')
+            normalized_database_filename = os.path.join(tmp, 'normalized.db')
+            with open(data_filename, 'w', encoding='utf-8') as f:
+                f.writelines(lines[:half])
+            ingest_incremental(data_filename, normalized_database_filename)
+
+            cut = len(lines[half]) // 2
+            with open(data_filename, 'a', encoding='utf-8') as f:
+                f.write(lines[half][:cut])
+            summary = ingest_incremental(data_filename, normalized_database_filename)
+            assert summary["OrderDetail"] == 0
+            with open(data_filename, 'a', encoding='utf-8') as f:
+                f.write(lines[half][cut:])
+                f.writelines(lines[half + 1:])
+            ingest_incremental(data_filename, normalized_database_filename)
+
+            full_database_filename = os.path.join(tmp, 'full.db')
+            build_normalized_database(data_filename, full_database_filename)
+            conn = sqlite3.connect(normalized_database_filename)
+            full = sqlite3.connect(full_database_filename)
+            # IDs of an incremental ingest differ from a rebuild, names do not
+            sql = """
+            SELECT FirstName, LastName, ProductName, OrderDate, QuantityOrdered
+            FROM OrderDetail
+            JOIN Customer USING (CustomerID)
+            JOIN Product USING (ProductID)
+            ORDER BY OrderID
+            """
+            assert conn.execute(sql).fetchall() == full.execute(sql).fetchall()
+            conn.close()
+            full.close()
+
+    def test_3(self):
+        # The first ingest of a file whose last line is cut inside its
+        # quantity or date column leaves that line for the next ingest
+        with open('data.csv', 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        half = len(lines) // 2
+        line = lines[half]
+        for column in [9, 10]:
+            cut = len("\t".join(line.split("\t")[:column])) + 2
+            with tempfile.TemporaryDirectory() as tmp:
+                data_filename = os.path.join(tmp, 'data.csv')
+                normalized_database_filename = os.path.join(tmp, 'normalized.db')
+                with open(data_filename, 'w', encoding='utf-8') as f:
+                    f.writelines(lines[:half])
+                    f.write(line[:cut])
+                assert ingest_incremental(data_filename, normalized_database_filename)["mode"] == "full"
+                with open(data_filename, 'a', encoding='utf-8') as f:
+                    f.write(line[cut:])
+                summary = ingest_incremental(data_filename, normalized_database_filename)
+                assert summary["mode"] == "incremental"
+                assert summary["OrderDetail"] == len(line.split("\t")[9].split(";")), column
+
+                full_database_filename = os.path.join(tmp, 'full.db')
+                build_normalized_database(data_filename, full_database_filename)
+                conn = sqlite3.connect(normalized_database_filename)
+                full = sqlite3.connect(full_database_filename)
+                sql = """
+                SELECT FirstName, LastName, ProductName, OrderDate, QuantityOrdered
+                FROM OrderDetail
+                JOIN Customer USING (CustomerID)
+                JOIN Product USING (ProductID)
+                ORDER BY OrderID
+                """
+                assert conn.execute(sql).fetchall() == full.execute(sql).fetchall(), column
+                conn.close()
+                full.close()
+
+    def test_4(self):
+        # Appended lines that repeat a customer's name with another address or
+        # country move that customer's orders like a rebuild does
+        with open('data.csv', 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        half = len(lines) // 2
+        countries = [line.split("\t")[3:5] for line in lines[1:]]
+        moved = []
+        for i, line in enumerate(lines[1:half:10]):
+            parts = line.split("\t")
+            parts[1] = "Moved " + parts[1]
+            parts[3:5] = countries[(i * 7) % len(countries)]
+            moved.append("\t".join(parts))
+        with tempfile.TemporaryDirectory() as tmp:
+            data_filename = os.path.join(tmp, 'data.csv')
+            normalized_database_filename = os.path.join(tmp, 'normalized.db')
+            with open(data_filename, 'w', encoding='utf-8') as f:
+                f.writelines(lines[:half])
+            ingest_incremental(data_filename, normalized_database_filename)
+            with open(data_filename, 'a', encoding='utf-8') as f:
+                f.writelines(moved + lines[half:])
+            assert ingest_incremental(data_filename, normalized_database_filename)["mode"] == "incremental"
+
+            full_database_filename = os.path.join(tmp, 'full.db')
+            build_normalized_database(data_filename, full_database_filename)
+            conn = sqlite3.connect(normalized_database_filename)
+            full = sqlite3.connect(full_database_filename)
+            sql = """
+            SELECT FirstName, LastName, Address, CountryName, Region, ProductName, OrderDate, QuantityOrdered
+            FROM OrderDetail
+            JOIN Customer USING (CustomerID)
+            JOIN Country USING (CountryID)
+            JOIN Region USING (RegionID)
+            JOIN Product USING (ProductID)
+            ORDER BY FirstName, LastName, ProductName, OrderDate, QuantityOrdered
+            """
+            assert conn.execute(sql).fetchall() == full.execute(sql).fetchall()
+            for name in ["ex4", "ex5", "ex6", "ex7"]:
+                sql_statement = STATIC_QUERIES[name](conn)
+                assert conn.execute(sql_statement).fetchall() == full.execute(sql_statement).fetchall(), name
+            assert check_sales_rollups(conn) == []
+            conn.close()
+            full.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+import sys
+from pathlib import Path
+
+sys.path.insert(1, str(Path(__file__).parents[1]))
+
+
+import mini_project2
+from mini_project2 import OrderDetailCollector
+
+
+class TestMethods(unittest.TestCase):
+
+    def test_1(self):
+        data_filename = 'data.csv'
+        normalized_database_filename = 'normalized.db'
+        dictionaries = {
+            "Customer": mini_project2.step6_create_customer_to_customerid_dictionary(normalized_database_filename),
+            "Product": mini_project2.step10_create_product_to_productid_dictionary(normalized_database_filename),
+        }
+
+        order_lines = []
+        with open(data_filename) as f:
+            next(f)
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                for i in OrderDetailCollector.explode:
+                    parts[i] = parts[i].split(";")
+                order_lines.extend(mini_project2.parse_order_lines(parts))
+        expected = list(mini_project2.resolve_order_lines(order_lines, dictionaries["Customer"], dictionaries["Product"]))
+
+        for workers in (None, 3):
+            collector = OrderDetailCollector()
+            mini_project2.scan_data_file(data_filename, [collector], workers=workers)
+            assert len(collector) == len(order_lines)
+            assert list(collector.rows(dictionaries.get)) == expected
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+import sys
+import datetime
+from pathlib import Path
+
+sys.path.insert(1, str(Path(__file__).parents[1]))
+
+
+from mini_project2 import convert_order_date
+
+
+class TestMethods(unittest.TestCase):
+
+    def test_1(self):
+        dates = ['20120814', '20121231', '20000229', '2012814', '201281', '09990101', '00010101']
+        for od in dates:
+            expected = datetime.datetime.strptime(od, "%Y%m%d").strftime("%Y-%m-%d")
+            assert convert_order_date(od) == expected
+
+    def test_2(self):
+        dates = ['20120230', '20121301', '20120100', '19000229', 'abcdefgh', '', '201208145']
+        for od in dates:
+            with self.assertRaises(ValueError):
+                datetime.datetime.strptime(od, "%Y%m%d")
+            with self.assertRaises(ValueError):
+                convert_order_date(od)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import sqlite3
+sys.path.insert(1, str(Path(__file__).parents[1]))
+
+
+import mini_project2
+from early_dates import with_early_dates
+
+class TestMethods(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.conn = sqlite3.connect("normalized.db")
+
+    def test_1(self):
+        df = pd.read_sql_query("""
+        SELECT count(*) COUNT FROM OrderDetail
+        JOIN OrderDetailDate ON OrderDetail.OrderID=OrderDetailDate.OrderID
+        WHERE OrderDetailDate.OrderYear=CAST(SUBSTR(OrderDetail.OrderDate,1,4) AS INTEGER)
+        AND OrderDetailDate.OrderMonth=CAST(SUBSTR(OrderDetail.OrderDate,6,2) AS INTEGER)
+        """, self.conn)
+        assert df['COUNT'][0] == 621806
+
+    def test_2(self):
+        for name in mini_project2.DATEPART_QUERIES:
+            sql_statement, params = mini_project2.prepare_query(self.conn, name, variant="dateparts")
+            assert sql_statement == mini_project2.DATEPART_QUERIES[name](self.conn)
+            data = pd.read_csv(name + ".csv")
+            df = pd.read_sql_query(sql_statement, self.conn, params=params)
+            assert df.equals(data) == True, name
+
+    def test_3(self):
+        # Short-year order dates, in the full ingest and in the appended lines
+        with open('data.csv', 'r', encoding='utf-8') as f:
+            lines = with_early_dates(f.readlines())
+        half = len(lines) // 2
+        with tempfile.TemporaryDirectory() as tmp:
+            data_filename = os.path.join(tmp, 'data.csv')
+            normalized_database_filename = os.path.join(tmp, 'normalized.db')
+            with open(data_filename, 'w', encoding='utf-8') as f:
+                f.writelines(lines[:half])
+            mini_project2.ingest_incremental(data_filename, normalized_database_filename)
+            with open(data_filename, 'a', encoding='utf-8') as f:
+                f.writelines(lines[half:])
+            assert mini_project2.ingest_incremental(data_filename, normalized_database_filename)["mode"] == "incremental"
+
+            conn = sqlite3.connect(normalized_database_filename)
+            months = conn.execute("""
+            SELECT DISTINCT OrderDetailDate.OrderMonth FROM OrderDetail
+            JOIN OrderDetailDate ON OrderDetail.OrderID=OrderDetailDate.OrderID
+            WHERE OrderDetail.OrderDate IN ('12-01-01','999-12-31','150-07-07')
+            """).fetchall()
+            assert months == [(None,)]
+            for name in mini_project2.DATEPART_QUERIES:
+                sql_statement = mini_project2.DATEPART_QUERIES[name](conn)
+                expected = conn.execute(mini_project2.STATIC_QUERIES[name](conn)).fetchall()
+                assert conn.execute(sql_statement).fetchall() == expected, name
+            conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
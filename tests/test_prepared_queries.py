@@ -0,0 +1,40 @@
+import unittest
+import sys
+from pathlib import Path
+
+import pandas as pd
+import sqlite3
+sys.path.insert(1, str(Path(__file__).parents[1]))
+
+
+import mini_project2
+
+class TestMethods(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.conn = sqlite3.connect("normalized.db")
+
+    def test_ex1(self):
+        sql_statement, params = mini_project2.prepare_query(self.conn, "ex1", 'Alejandra Camino')
+        data = pd.read_csv("ex1_1.csv")
+        df = pd.read_sql_query(sql_statement, self.conn, params=params)
+        assert df.equals(data) == True
+        other_statement, _ = mini_project2.prepare_query(self.conn, "ex1", 'Eduardo Saavedra')
+        assert other_statement == sql_statement
+
+    def test_ex2(self):
+        sql_statement, params = mini_project2.prepare_query(self.conn, "ex2", 'Eduardo Saavedra')
+        data = pd.read_csv("ex2_2.csv")
+        df = pd.read_sql_query(sql_statement, self.conn, params=params)
+        assert df.equals(data) == True
+
+    def test_ex3(self):
+        sql_statement, params = mini_project2.prepare_query(self.conn, "ex3")
+        assert params == ()
+        data = pd.read_csv("ex3.csv")
+        df = pd.read_sql_query(sql_statement, self.conn, params=params)
+        assert df.equals(data) == True
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+import sys
+import os
+import random
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import sqlite3
+sys.path.insert(1, str(Path(__file__).parents[1]))
+
+
+import mini_project2
+from early_dates import with_early_dates
+
+class TestMethods(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.conn = sqlite3.connect("normalized.db")
+
+    def test_1(self):
+        cents = self.conn.execute("SELECT SUM(RevenueCents) FROM SalesRollup").fetchone()[0]
+        total = self.conn.execute("""
+        SELECT SUM(Product.ProductUnitPrice*OrderDetail.QuantityOrdered)
+        FROM OrderDetail JOIN Product ON OrderDetail.ProductID=Product.ProductID
+        """).fetchone()[0]
+        assert abs(cents / 100 - total) < 0.01
+
+    def test_2(self):
+        for name in mini_project2.ROLLUP_QUERIES:
+            sql_statement, params = mini_project2.prepare_query(self.conn, name, variant="rollup")
+            assert sql_statement == mini_project2.ROLLUP_QUERIES[name](self.conn)
+            data = pd.read_csv(name + ".csv")
+            df = pd.read_sql_query(sql_statement, self.conn, params=params)
+            assert df.equals(data) == True, name
+
+    def test_3(self):
+        assert mini_project2.check_sales_rollups(self.conn) == []
+        before = self.conn.execute("SELECT SUM(RevenueCents) FROM SalesRollup").fetchone()[0]
+        try:
+            self.conn.execute("""
+            INSERT INTO OrderDetail(CustomerID,ProductID,OrderDate,QuantityOrdered)
+            SELECT CustomerID,ProductID,'1999-12-31',2 FROM OrderDetail LIMIT 1
+            """)
+            after = self.conn.execute("SELECT SUM(RevenueCents) FROM SalesRollup").fetchone()[0]
+            assert after > before
+            assert mini_project2.check_sales_rollups(self.conn) == []
+        finally:
+            self.conn.rollback()
+
+    def write_data_file(self, data_filename, prices):
+        # Random order lines over the given product prices, in the data.csv layout
+        random.seed(1)
+        with open("data.csv") as f:
+            header = f.readline()
+        with open(data_filename, "w") as f:
+            f.write(header)
+            for i in range(3000):
+                country = random.randrange(6)
+                lines = [random.randrange(len(prices)) for _ in range(random.randint(1, 8))]
+                f.write("\t".join([
+                    f"First{i} Last{i}", f"{i} Main St", "City", f"Country{country}", f"Region{country % 3}",
+                    ";".join(f"Prod{p}" for p in lines),
+                    ";".join(f"Category{p % 4}" for p in lines),
+                    ";".join(f"Description{p % 4}" for p in lines),
+                    ";".join(prices[p] for p in lines),
+                    ";".join(str(random.randint(1, 30)) for _ in lines),
+                    ";".join(f"{random.randint(2010, 2014)}{random.randint(1, 12):02d}{random.randint(1, 28):02d}"
+                             for _ in lines),
+                ]) + "\n")
+
+    def test_4(self):
+        # The registered rollup variants match exN on data with many totals
+        # ending in .5 and .005
+        prices = [f"{random.Random(p).randint(100, 9999) / 100:.2f}" for p in range(40)]
+        with tempfile.TemporaryDirectory() as tmp:
+            data_filename = os.path.join(tmp, "data.csv")
+            normalized_database_filename = os.path.join(tmp, "normalized.db")
+            self.write_data_file(data_filename, prices)
+            mini_project2.build_normalized_database(data_filename, normalized_database_filename)
+            conn = sqlite3.connect(normalized_database_filename)
+            # Rebuilding replaces the rollup and its trigger
+            mini_project2.build_sales_rollups(conn)
+            for name in mini_project2.ROLLUP_QUERIES:
+                sql_statement, params = mini_project2.prepare_query(conn, name, variant="rollup")
+                assert sql_statement == mini_project2.ROLLUP_QUERIES[name](conn)
+                expected = conn.execute(mini_project2.STATIC_QUERIES[name](conn)).fetchall()
+                assert conn.execute(sql_statement, params).fetchall() == expected, name
+            conn.close()
+
+    def test_5(self):
+        # Without whole-cent prices there is no rollup and the variants fall back to exN
+        prices = ["1.005", "2.5", "3.25"]
+        with tempfile.TemporaryDirectory() as tmp:
+            data_filename = os.path.join(tmp, "data.csv")
+            normalized_database_filename = os.path.join(tmp, "normalized.db")
+            self.write_data_file(data_filename, prices)
+            mini_project2.build_normalized_database(data_filename, normalized_database_filename)
+            conn = sqlite3.connect(normalized_database_filename)
+            for variant in ["rollup", "rollup_cents"]:
+                for name in mini_project2.QUERY_VARIANTS[variant]:
+                    sql_statement, params = mini_project2.prepare_query(conn, name, variant=variant)
+                    assert sql_statement == mini_project2.STATIC_QUERIES[name](conn)
+            conn.close()
+
+    def test_6(self):
+        # Short-year order dates, whose month ex10 may or may not name
+        prices = ["1.25", "2.50", "3.75"]
+        with tempfile.TemporaryDirectory() as tmp:
+            data_filename = os.path.join(tmp, "data.csv")
+            normalized_database_filename = os.path.join(tmp, "normalized.db")
+            self.write_data_file(data_filename, prices)
+            with open(data_filename) as f:
+                lines = with_early_dates(f.readlines(), every=2)
+            with open(data_filename, "w") as f:
+                f.writelines(lines)
+            mini_project2.build_normalized_database(data_filename, normalized_database_filename)
+            conn = sqlite3.connect(normalized_database_filename)
+            for name in mini_project2.ROLLUP_QUERIES:
+                sql_statement, params = mini_project2.prepare_query(conn, name, variant="rollup")
+                assert sql_statement == mini_project2.ROLLUP_QUERIES[name](conn)
+                expected = conn.execute(mini_project2.STATIC_QUERIES[name](conn)).fetchall()
+                assert conn.execute(sql_statement, params).fetchall() == expected, name
+            conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
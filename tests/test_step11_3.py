@@ -0,0 +1,50 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import sqlite3
+sys.path.insert(1, str(Path(__file__).parents[1]))
+
+
+from mini_project2 import BuildProfiler, build_normalized_database, step11_create_orderdetail_table
+
+
+class TestMethods(unittest.TestCase):
+
+    def test_1(self):
+        normalized_database_filename = 'normalized.db'
+        data_filename = 'data.csv'
+        step11_create_orderdetail_table(data_filename, normalized_database_filename, batch_size=10000)
+        data = pd.read_csv("step11.csv")
+        conn = sqlite3.connect(normalized_database_filename)
+        df = pd.read_sql_query("""SELECT * FROM OrderDetail LIMIT 1000""", conn)
+        assert df.equals(data) == True
+        df = pd.read_sql_query("""SELECT count(*) COUNT FROM OrderDetail""", conn)
+        assert df['COUNT'][0] == 621806
+        conn.close()
+
+    def test_2(self):
+        # Streaming OrderDetail reads data.csv once, without a scan before it
+        data_filename = 'data.csv'
+        with tempfile.TemporaryDirectory() as tmp:
+            normalized_database_filename = os.path.join(tmp, 'normalized.db')
+            build_normalized_database(data_filename, normalized_database_filename)
+            report_filename = os.path.join(tmp, 'build_profile.json')
+            with BuildProfiler(report_filename):
+                step11_create_orderdetail_table(data_filename, normalized_database_filename, batch_size=10000)
+            with open(report_filename) as f:
+                report = json.load(f)
+            conn = sqlite3.connect(normalized_database_filename)
+            count = conn.execute("SELECT COUNT(*) FROM OrderDetail").fetchone()[0]
+            conn.close()
+        assert "rows_in" not in report["counts"]
+        assert "scan_data_file" not in report["functions"]
+        assert report["counts"]["OrderDetail.rows_out"] == count
+
+
+if __name__ == '__main__':
+    unittest.main()